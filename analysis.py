@@ -0,0 +1,102 @@
+import collections
+import sys
+import threading
+
+import search
+
+# Анализ позиции для подсказок: каждый ход оценивается поиском с полным
+# окном, глубина растёт, пока позиция не изменится. Готовые результаты
+# хранятся в LRU по ключу позиции с ограничением памяти, поэтому повторный
+# щелчок по фишке, откат или просмотр записи не запускают поиск заново.
+
+CACHE_BYTES = 8 << 20
+MAX_DEPTH = 12
+# Приблизительный размер записи: кортеж (оценка, ход) и сам ход
+MOVE_BYTES = sys.getsizeof((0, (0, 0))) + sys.getsizeof((0, 0))
+ENTRY_BYTES = 200
+
+# ranking - список (оценка, ход) от лучшего хода к худшему, оценка с точки
+# зрения стороны, которая ходит
+Analysis = collections.namedtuple('Analysis', 'depth ranking')
+
+
+def cache_key(position):
+    variant = position.variant
+    return variant.difficulty, variant.size, position.key
+
+
+def entry_bytes(analysis):
+    return ENTRY_BYTES + sys.getsizeof(analysis.ranking) + len(analysis.ranking) * MOVE_BYTES
+
+
+class AnalysisCache:
+    # Пишет фоновый поток анализа, читает интерфейс, поэтому доступ под замком
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, position):
+        key = cache_key(position)
+        with self.lock:
+            analysis = self.entries.get(key)
+            if analysis is not None:
+                self.entries.move_to_end(key)
+            return analysis
+
+    def put(self, position, analysis):
+        key = cache_key(position)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                if old.depth > analysis.depth:
+                    analysis = old
+                self.bytes -= entry_bytes(old)
+            self.entries[key] = analysis
+            self.bytes += entry_bytes(analysis)
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                _, dropped = self.entries.popitem(last=False)
+                self.bytes -= entry_bytes(dropped)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+
+class Analyzer:
+    def __init__(self, max_bytes=CACHE_BYTES, max_depth=MAX_DEPTH, tt_bits=18):
+        self.cache = AnalysisCache(max_bytes)
+        self.max_depth = max_depth
+        self.tt = search.TranspositionTable(tt_bits)
+
+    def cached(self, position):
+        return self.cache.get(position)
+
+    def searcher(self):
+        # Каждому анализу свой Searcher: остановленный может ещё дорабатывать
+        # в своём потоке, а таблица переходов общая
+        return search.Searcher(tt=self.tt, book=False)
+
+    def deepen(self, position, searcher=None, max_depth=None):
+        # Отдаёт Analysis после каждой законченной глубины, начиная с той,
+        # что уже есть в кэше; прерывается вызовом searcher.stop()
+        searcher = searcher or self.searcher()
+        max_depth = max_depth or self.max_depth
+        cached = self.cache.get(position)
+        depth = cached.depth if cached is not None else 0
+        while depth < max_depth and not searcher.stopped:
+            depth += 1
+            try:
+                ranking = searcher.rank(position, depth)
+            except search.SearchTimeout:
+                return
+            analysis = Analysis(depth, ranking)
+            self.cache.put(position, analysis)
+            yield analysis
+            if not ranking or abs(ranking[0][0]) >= search.MATE_BOUND:
+                return
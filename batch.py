@@ -0,0 +1,219 @@
+import argparse
+import collections
+import random
+import time
+
+import numpy as np
+
+import engine
+
+# Пакетные правила на NumPy: B независимых досок, каждая строка доски -
+# битовая маска uint16 (бит x строки y - клетка y * size + x, доска до 16x16),
+# всего rows[B, 2, size]. Ходы всех досок считаются сдвигами этих масок: по
+# горизонтали - сдвигом битов, по вертикали - сдвигом строк.
+# Ход задаётся парой (from, to) номеров клеток, (-1, -1) - пропуск хода.
+
+RIGHT, LEFT, DOWN, UP = DIRECTIONS = range(4)
+PASS = (-1, -1)
+
+# Законные ходы: squares[b, p] - клетка p-й фишки ходящего игрока,
+# destinations[b, p] - строки маски клеток, куда она может пойти
+Legal = collections.namedtuple('Legal', 'squares destinations')
+
+
+def mask_to_rows(mask, size):
+    full = (1 << size) - 1
+    return np.array([(mask >> (y * size)) & full for y in range(size)], dtype=np.uint16)
+
+
+def rows_to_mask(rows):
+    size = len(rows)
+    return sum(int(row) << (y * size) for y, row in enumerate(rows))
+
+
+class Batch:
+    def __init__(self, difficulty, count, size=engine.BOARD_SIZE):
+        self.variant = engine.variant(difficulty, size)
+        self.size = size
+        self.full = np.uint16((1 << size) - 1)
+        self.bits = np.arange(size, dtype=np.uint16)
+        start = np.stack([mask_to_rows(mask, size) for mask in self.variant.start])
+        self.rows = np.repeat(start[None], count, axis=0)
+        self.side = np.ones(count, dtype=np.int8)
+        self.ply = np.zeros(count, dtype=np.int32)
+        self.targets = {rule: np.stack([mask_to_rows(mask, size) for mask in engine.variant(rule, size).target])
+                        for rule in engine.DIFFICULTIES}
+
+    def __len__(self):
+        return len(self.side)
+
+    @classmethod
+    def from_positions(cls, positions):
+        first = positions[0]
+        batch = cls(first.variant.difficulty, len(positions), first.size)
+        for index, position in enumerate(positions):
+            batch.rows[index] = np.stack([mask_to_rows(mask, first.size) for mask in position.masks])
+            batch.side[index] = position.side
+            batch.ply[index] = position.ply
+        return batch
+
+    def position(self, index):
+        masks = [rows_to_mask(self.rows[index, side]) for side in (0, 1)]
+        return engine.Position.from_state((self.variant.difficulty, self.size, masks[0], masks[1],
+                                           int(self.side[index]), int(self.ply[index])))
+
+    def shift(self, a, direction):
+        # Маски, сдвинутые на клетку вправо, влево, вниз или вверх, без
+        # заворачивания через край
+        if direction == RIGHT:
+            return (a << 1) & self.full
+        if direction == LEFT:
+            return a >> 1
+        out = np.zeros_like(a)
+        if direction == DOWN:
+            out[..., 1:] = a[..., :-1]
+        else:
+            out[..., :-1] = a[..., 1:]
+        return out
+
+    def unpack(self, rows):
+        # rows[..., size] -> bool[..., size * size]
+        return ((rows[..., None] >> self.bits) & 1).astype(bool).reshape(*rows.shape[:-1], -1)
+
+    def legal_moves(self):
+        # Legal для всех досок сразу, включая цепочки прыжков; каждая фишка -
+        # одна маска, поэтому работа не растёт с числом клеток в квадрате
+        count, size = len(self), self.size
+        boards = np.arange(count)
+        # Число фишек у игрока не меняется, поэтому в каждой строке их поровну
+        squares = np.nonzero(self.unpack(self.rows[boards, self.side]))[1].reshape(count, -1)
+        pieces = np.arange(squares.shape[1])
+        origin = np.zeros((count, squares.shape[1], size), dtype=np.uint16)
+        origin[boards[:, None], pieces, squares // size] = np.left_shift(1, squares % size).astype(np.uint16)
+        # Фишка, которая ходит, не занимает свою исходную клетку
+        occupied = (self.rows[:, 0] | self.rows[:, 1])[:, None] & ~origin
+        empty = ~occupied & self.full
+
+        destinations = np.zeros_like(origin)
+        for direction in DIRECTIONS:
+            destinations |= self.shift(origin, direction)
+        destinations &= empty
+
+        # Прыжок: через занятую соседнюю клетку на свободную за ней
+        reached = origin.copy()
+        frontier = origin
+        while frontier.any():
+            landed = np.zeros_like(frontier)
+            for direction in DIRECTIONS:
+                landed |= self.shift(self.shift(frontier, direction) & occupied, direction)
+            frontier = landed & empty & ~reached
+            reached |= frontier
+        destinations |= reached & ~origin
+        return Legal(squares, destinations)
+
+    def moves(self, legal, index):
+        # Список ходов (from, to) одной доски
+        return [(int(frm), to) for frm, rows in zip(legal.squares[index], legal.destinations[index])
+                for to in engine.squares(rows_to_mask(rows))]
+
+    def apply(self, moves):
+        moves = np.asarray(moves)
+        frm, to = moves[:, 0], moves[:, 1]
+        boards = np.nonzero(frm >= 0)[0]
+        sides = self.side[boards]
+        frm, to = frm[boards], to[boards]
+        self.rows[boards, sides, frm // self.size] &= ~np.left_shift(1, frm % self.size).astype(np.uint16)
+        self.rows[boards, sides, to // self.size] |= np.left_shift(1, to % self.size).astype(np.uint16)
+        self.side ^= 1
+        self.ply += 1
+
+    def winners(self):
+        # winners[rule_index, b]: 0 или 1 - победитель по правилу, -1 - нет победителя
+        result = np.empty((len(engine.DIFFICULTIES), len(self)), dtype=np.int8)
+        for index, rule in enumerate(engine.DIFFICULTIES):
+            counts = np.bitwise_count(self.rows & self.targets[rule][None]).sum(axis=2, dtype=np.int32)
+            won = counts >= engine.variant(rule, self.size).win_count
+            result[index] = np.where(won[:, 0], 0, np.where(won[:, 1], 1, -1))
+        return result
+
+    def random_moves(self, rng, legal=None):
+        # Случайный ход на каждой доске; без ходов - пропуск
+        legal = self.legal_moves() if legal is None else legal
+        flat = self.unpack(legal.destinations).reshape(len(self), -1)
+        scores = rng.random(flat.shape, dtype=np.float32) * flat
+        choice = scores.argmax(axis=1)
+        cells = self.size * self.size
+        frm = legal.squares[np.arange(len(self)), choice // cells]
+        moves = np.stack([frm, choice % cells], axis=1)
+        moves[~flat.any(axis=1)] = PASS
+        return moves
+
+
+def crosscheck(difficulty, boards=64, plies=60, seed=0, size=engine.BOARD_SIZE):
+    # Сравнение пакетных правил с engine.Position на случайных партиях
+    rng = np.random.default_rng(seed)
+    scalar_rng = random.Random(seed)
+    positions = [engine.Position(difficulty, size) for _ in range(boards)]
+    for position in positions:
+        for _ in range(scalar_rng.randrange(4)):
+            position.make(scalar_rng.choice(position.moves()))
+    batch = Batch.from_positions(positions)
+    for _ in range(plies):
+        legal = batch.legal_moves()
+        winners = batch.winners()
+        for index, position in enumerate(positions):
+            expected = sorted(position.moves())
+            if sorted(batch.moves(legal, index)) != expected:
+                raise AssertionError(f"{difficulty}: ходы доски {index} расходятся\n{position}")
+            for rule_index, rule in enumerate(engine.DIFFICULTIES):
+                winner = position.winner(rule)
+                if (-1 if winner is None else winner) != winners[rule_index, index]:
+                    raise AssertionError(f"{difficulty}: победитель по {rule} на доске {index} расходится")
+        moves = batch.random_moves(rng, legal)
+        for position, (frm, to) in zip(positions, moves.tolist()):
+            if frm < 0:
+                position.make_pass()
+            else:
+                position.make((frm, to))
+        batch.apply(moves)
+        for index, position in enumerate(positions):
+            if batch.position(index).state() != position.state():
+                raise AssertionError(f"{difficulty}: позиция доски {index} после хода расходится")
+    return boards * plies
+
+
+def scalar_rate(difficulty, boards, plies=10, seed=0):
+    # Та же работа циклом по engine.Position: ходы, победители, случайный ход
+    rng = random.Random(seed)
+    positions = [engine.Position(difficulty) for _ in range(boards)]
+    started = time.perf_counter()
+    for _ in range(plies):
+        for position in positions:
+            moves = position.moves()
+            for rule in engine.DIFFICULTIES:
+                position.winner(rule)
+            if moves:
+                position.make(rng.choice(moves))
+            else:
+                position.make_pass()
+    return plies * boards / (time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Проверка и замер пакетных правил")
+    parser.add_argument('--boards', type=int, default=1024)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for difficulty in engine.DIFFICULTIES:
+        checked = sum(crosscheck(difficulty, seed=args.seed, size=size) for size in engine.BOARD_SIZES)
+        batch = Batch(difficulty, args.boards)
+        rng = np.random.default_rng(args.seed)
+        started = time.perf_counter()
+        for _ in range(10):
+            legal = batch.legal_moves()
+            batch.winners()
+            batch.apply(batch.random_moves(rng, legal))
+        elapsed = time.perf_counter() - started
+        print(f"{difficulty}: {checked} positions match, {10 * args.boards / elapsed:.0f} board-plies/s, "
+              f"scalar {scalar_rate(difficulty, args.boards, seed=args.seed):.0f} board-plies/s")
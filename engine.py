@@ -0,0 +1,407 @@
+import collections
+import random
+import sys
+
+# Правила уголков без Qt: позиция хранится как две битовые маски
+# (по одной на игрока) и очередь хода.
+# Клетка (x, y) соответствует биту y * size + x.
+# Игрок 0 (color1) стартует в левом верхнем углу, игрок 1 (color2) - в
+# правом нижнем и ходит первым.
+
+BOARD_SIZE = 8
+BOARD_SIZES = (8, 10, 12, 16)
+CLASSIC = 'classic'
+MEDIUM = 'medium'
+HARD = 'hard'
+DIFFICULTIES = (CLASSIC, MEDIUM, HARD)
+# Лагеря заданы для доски BOARD_SIZE и растут пропорционально размеру:
+# прямоугольник (ширина, высота) или треугольник x + y < n
+CAMPS = {
+    CLASSIC: ('rectangle', 3, 3),
+    MEDIUM: ('rectangle', 4, 3),
+    HARD: ('triangle', 5),
+}
+# Для победы нужно занять весь лагерь соперника, кроме перечисленных уровней
+WIN_COUNTS = {MEDIUM: 1}
+# Ничья: позиция (с очередью хода) повторилась repetitions раз или за
+# no_progress полуходов ни один игрок не уменьшил сумму расстояний своих
+# фишек до цели (Position.progress) ниже прежнего минимума; max_plies -
+# необязательный предел длины партии. Продвижение считается по расстояниям,
+# а не по фишкам в зоне: в medium первая же фишка в зоне - уже победа.
+# no_progress задан для доски BOARD_SIZE и растёт с её размером
+NO_PROGRESS_PLIES = 40
+DrawRules = collections.namedtuple('DrawRules', 'repetitions no_progress max_plies',
+                                   defaults=(3, NO_PROGRESS_PLIES, None))
+DEFAULT_RULES = DrawRules()
+# Фиксированное зерно: ключи позиций одинаковы во всех процессах и запусках
+ZOBRIST_SEED = 0x5567_6f6c_6b69
+
+_variants = {}
+_geometries = {}
+
+
+def square(x, y, size=BOARD_SIZE):
+    return y * size + x
+
+
+def point(sq, size=BOARD_SIZE):
+    return sq % size, sq // size
+
+
+def squares(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def mask_of(points, size=BOARD_SIZE):
+    mask = 0
+    for x, y in points:
+        mask |= 1 << square(x, y, size)
+    return mask
+
+
+class Geometry:
+    # Соседи и прыжки для каждой клетки, считаются один раз на размер доски
+    def __init__(self, size=BOARD_SIZE):
+        self.size = size
+        self.neighbours = []
+        self.jumps = []
+        for sq in range(size * size):
+            x, y = point(sq, size)
+            neighbours = []
+            jumps = []
+            for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                if 0 <= x + dx < size and 0 <= y + dy < size:
+                    neighbours.append(square(x + dx, y + dy, size))
+                    if 0 <= x + 2 * dx < size and 0 <= y + 2 * dy < size:
+                        jumps.append((square(x + dx, y + dy, size), square(x + 2 * dx, y + 2 * dy, size)))
+            self.neighbours.append(tuple(neighbours))
+            self.jumps.append(tuple(jumps))
+        rng = random.Random(ZOBRIST_SEED + size)
+        self.zobrist = tuple(tuple(rng.getrandbits(64) for _ in range(size * size)) for _ in range(2))
+        self.zobrist_side = rng.getrandbits(64)
+
+
+def geometry(size=BOARD_SIZE):
+    if size not in _geometries:
+        _geometries[size] = Geometry(size)
+    return _geometries[size]
+
+
+def jump_targets(geo, frm, occupied):
+    # Все клетки, достижимые цепочкой прыжков из frm, без повторов и циклов
+    occupied &= ~(1 << frm)
+    seen = 1 << frm
+    stack = [frm]
+    targets = []
+    jumps = geo.jumps
+    while stack:
+        for over, to in jumps[stack.pop()]:
+            if occupied >> over & 1 and not (occupied | seen) >> to & 1:
+                seen |= 1 << to
+                stack.append(to)
+                targets.append(to)
+    return targets
+
+
+def step_targets(geo, frm, occupied):
+    return [to for to in geo.neighbours[frm] if not occupied >> to & 1]
+
+
+def distances(size, sources, edges):
+    # Число ходов от каждой клетки до ближайшей клетки sources по рёбрам edges
+    distance = [None] * (size * size)
+    frontier = list(squares(sources))
+    for sq in frontier:
+        distance[sq] = 0
+    while frontier:
+        reached = []
+        for sq in frontier:
+            for to in edges[sq]:
+                if distance[to] is None:
+                    distance[to] = distance[sq] + 1
+                    reached.append(to)
+        frontier = reached
+    return distance
+
+
+def distance_table(variant, side):
+    # Вне зоны: ходов до зоны шагами плюс ходов, если каждый ход может быть
+    # прыжком (пессимистичная и оптимистичная оценки вместе). В зоне: чем
+    # глубже клетка, тем меньше, чтобы фишки не загораживали вход.
+    geo = variant.geometry
+    size = variant.size
+    target = variant.target[side]
+    leaps = [neighbours + tuple(to for _, to in jumps) for neighbours, jumps in zip(geo.neighbours, geo.jumps)]
+    steps = distances(size, target, geo.neighbours)
+    hops = distances(size, target, leaps)
+    depth = distances(size, variant.full & ~target, geo.neighbours)
+    return tuple(1 - depth[sq] if target >> sq & 1 else steps[sq] + hops[sq] for sq in range(size * size))
+
+
+def camp(difficulty, size=BOARD_SIZE):
+    # Клетки лагеря игрока 0 в левом верхнем углу
+    shape, *dimensions = CAMPS[difficulty]
+    width, *rest = (max(1, int(dimension * size / BOARD_SIZE + 0.5)) for dimension in dimensions)
+    if shape == 'triangle':
+        return [(x, y) for y in range(size) for x in range(size) if x + y < width]
+    return [(x, y) for y in range(rest[0]) for x in range(width)]
+
+
+class Variant:
+    # Стартовая расстановка, целевые зоны и условие победы для уровня сложности
+    def __init__(self, difficulty, size=BOARD_SIZE):
+        self.difficulty = difficulty
+        self.size = size
+        self.full = (1 << size * size) - 1
+        self.geometry = geometry(size)
+
+        points = camp(difficulty, size)
+        mirrored = [(size - 1 - x, size - 1 - y) for x, y in points]
+
+        self.start = (mask_of(points, size), mask_of(mirrored, size))
+        if self.start[0] & self.start[1]:
+            raise ValueError(f"{difficulty}: лагеря пересекаются на доске {size}x{size}")
+        # Каждый игрок должен занять лагерь соперника
+        self.target = (self.start[1], self.start[0])
+        self.win_count = WIN_COUNTS.get(difficulty, len(points))
+        # Угол для начисления очков - всегда классический лагерь
+        corner = camp(CLASSIC, size)
+        self.corner = (mask_of([(size - 1 - x, size - 1 - y) for x, y in corner], size),
+                       mask_of(corner, size))
+        # Оценка удалённости клетки от цели для каждого игрока
+        self.distance = (distance_table(self, 0), distance_table(self, 1))
+
+
+def variant(difficulty, size=BOARD_SIZE):
+    key = (difficulty, size)
+    if key not in _variants:
+        _variants[key] = Variant(difficulty, size)
+    return _variants[key]
+
+
+def no_progress_plies(rules, size=BOARD_SIZE):
+    return rules.no_progress * size // BOARD_SIZE
+
+
+class Position:
+    __slots__ = ('variant', 'masks', 'side', 'ply', 'history', 'in_home', 'key', 'progress',
+                 'seen', 'best_progress', 'advances', 'previous_best')
+
+    def __init__(self, difficulty=HARD, size=BOARD_SIZE):
+        self.variant = variant(difficulty, size)
+        self.reset()
+
+    def reset(self):
+        self.masks = list(self.variant.start)
+        self.side = 1
+        self.ply = 0
+        self.history = []
+        self.count_home()
+        self.start_history()
+
+    def hash(self):
+        geo = self.variant.geometry
+        key = geo.zobrist_side if self.side else 0
+        for side in (0, 1):
+            for sq in squares(self.masks[side]):
+                key ^= geo.zobrist[side][sq]
+        return key
+
+    def count_home(self):
+        # Сколько фишек каждого игрока уже стоит в его целевой зоне и сумма
+        # их расстояний до цели; дальше счётчики обновляет только make/unmake
+        target = self.variant.target
+        self.in_home = [(self.masks[0] & target[0]).bit_count(), (self.masks[1] & target[1]).bit_count()]
+        distance = self.variant.distance
+        self.progress = [sum(distance[side][sq] for sq in squares(self.masks[side])) for side in (0, 1)]
+        self.key = self.hash()
+
+    def start_history(self):
+        # Счётчики повторов и полуходов без продвижения ведутся с этой позиции
+        self.seen = {self.key: 1}
+        self.best_progress = list(self.progress)
+        # Полуходы, на которых кто-то обновил минимум суммы расстояний, и
+        # прежние минимумы для unmake
+        self.advances = [self.ply]
+        self.previous_best = []
+
+    @property
+    def size(self):
+        return self.variant.size
+
+    @property
+    def occupied(self):
+        return self.masks[0] | self.masks[1]
+
+    def piece_at(self, sq):
+        if self.masks[0] >> sq & 1:
+            return 0
+        if self.masks[1] >> sq & 1:
+            return 1
+        return None
+
+    def state(self):
+        # Компактное представление, которое можно передать в другой процесс
+        return self.variant.difficulty, self.variant.size, self.masks[0], self.masks[1], self.side, self.ply
+
+    def tracking(self):
+        # История для правил ничьей: встреченные ключи, полуход последнего
+        # продвижения и минимумы сумм расстояний; передаётся вместе с state()
+        return dict(self.seen), self.advances[-1], tuple(self.best_progress)
+
+    @classmethod
+    def from_state(cls, state, tracking=None):
+        difficulty, size, mask0, mask1, side, ply = state
+        position = cls(difficulty, size)
+        position.masks = [mask0, mask1]
+        position.side = side
+        position.ply = ply
+        position.count_home()
+        position.start_history()
+        if tracking is not None:
+            seen, advance, best_progress = tracking
+            position.seen = dict(seen)
+            position.advances = [advance]
+            position.best_progress = list(best_progress)
+        return position
+
+    def copy(self):
+        # Копия без списка ходов, но с историей повторов и продвижения
+        return Position.from_state(self.state(), self.tracking())
+
+    def moves(self):
+        geo = self.variant.geometry
+        occupied = self.masks[0] | self.masks[1]
+        moves = []
+        for frm in squares(self.masks[self.side]):
+            for to in jump_targets(geo, frm, occupied):
+                moves.append((frm, to))
+            for to in step_targets(geo, frm, occupied):
+                moves.append((frm, to))
+        return moves
+
+    def moves_from(self, sq):
+        geo = self.variant.geometry
+        occupied = self.occupied
+        return [(sq, to) for to in jump_targets(geo, sq, occupied) + step_targets(geo, sq, occupied)]
+
+    def jumps_from(self, sq):
+        return [(sq, to) for to in jump_targets(self.variant.geometry, sq, self.occupied)]
+
+    def is_legal(self, move):
+        frm, _ = move
+        return self.masks[self.side] >> frm & 1 and move in self.moves_from(frm)
+
+    def make(self, move):
+        frm, to = move
+        side = self.side
+        self.masks[side] ^= (1 << frm) | (1 << to)
+        target = self.variant.target[side]
+        self.in_home[side] += (target >> to & 1) - (target >> frm & 1)
+        distance = self.variant.distance[side]
+        self.progress[side] += distance[to] - distance[frm]
+        geo = self.variant.geometry
+        self.key ^= geo.zobrist[side][frm] ^ geo.zobrist[side][to] ^ geo.zobrist_side
+        self.history.append(move)
+        self.side ^= 1
+        self.ply += 1
+        if self.progress[side] < self.best_progress[side]:
+            self.previous_best.append(self.best_progress[side])
+            self.best_progress[side] = self.progress[side]
+            self.advances.append(self.ply)
+        seen = self.seen
+        seen[self.key] = seen.get(self.key, 0) + 1
+
+    def make_pass(self):
+        self.key ^= self.variant.geometry.zobrist_side
+        self.history.append(None)
+        self.side ^= 1
+        self.ply += 1
+        seen = self.seen
+        seen[self.key] = seen.get(self.key, 0) + 1
+
+    def unmake(self):
+        move = self.history.pop()
+        seen = self.seen
+        count = seen[self.key] - 1
+        if count:
+            seen[self.key] = count
+        else:
+            del seen[self.key]
+        advances = self.advances
+        if advances[-1] == self.ply and len(advances) > 1:
+            advances.pop()
+            self.best_progress[self.side ^ 1] = self.previous_best.pop()
+        self.side ^= 1
+        self.ply -= 1
+        geo = self.variant.geometry
+        self.key ^= geo.zobrist_side
+        if move is not None:
+            frm, to = move
+            side = self.side
+            self.masks[side] ^= (1 << frm) | (1 << to)
+            target = self.variant.target[side]
+            self.in_home[side] += (target >> frm & 1) - (target >> to & 1)
+            distance = self.variant.distance[side]
+            self.progress[side] += distance[frm] - distance[to]
+            self.key ^= geo.zobrist[side][frm] ^ geo.zobrist[side][to]
+        return move
+
+    def in_target(self, side, rule=None):
+        if rule is None or rule == self.variant.difficulty:
+            return self.in_home[side]
+        return (self.masks[side] & variant(rule, self.size).target[side]).bit_count()
+
+    def winner(self, rule=None):
+        if rule is None or rule == self.variant.difficulty:
+            win_count = self.variant.win_count
+            in_home = self.in_home
+        else:
+            win_count = variant(rule, self.size).win_count
+            in_home = (self.in_target(0, rule), self.in_target(1, rule))
+        if in_home[0] >= win_count:
+            return 0
+        if in_home[1] >= win_count:
+            return 1
+        return None
+
+    def evaluate(self):
+        # Насколько ходящий игрок ближе к цели, чем соперник
+        return self.progress[1 - self.side] - self.progress[self.side]
+
+    def in_corner(self, sq, side):
+        return bool(self.variant.corner[side] >> sq & 1)
+
+    @property
+    def quiet(self):
+        # Полуходов без продвижения к цели
+        return self.ply - self.advances[-1]
+
+    def draw_reason(self, rules=None):
+        rules = rules or DEFAULT_RULES
+        if rules.repetitions and self.seen.get(self.key, 0) >= rules.repetitions:
+            return 'repetition'
+        if rules.no_progress and self.quiet >= no_progress_plies(rules, self.size):
+            return 'no_progress'
+        if rules.max_plies is not None and self.ply >= rules.max_plies:
+            return 'move_limit'
+        return None
+
+    def is_draw(self, rules=None):
+        return self.draw_reason(rules) is not None
+
+    def __str__(self):
+        size = self.size
+        marks = {None: '.', 0: 'x', 1: 'o'}
+        return '\n'.join(''.join(marks[self.piece_at(square(x, y, size))] for x in range(size))
+                         for y in range(size))
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or DIFFICULTIES:
+        position = Position(name)
+        print(name, len(position.moves()), 'moves')
+        print(position)
@@ -1,20 +1,129 @@
 import sys
 import time
+
+# Отсчёт для --startup-profile: от этой отметки меряется время импортов
+STARTED = time.perf_counter()
+
+import json
 import random
 from PyQt6.QtWidgets import QApplication, QMainWindow, QGraphicsView, QGraphicsScene, QGraphicsEllipseItem, \
-    QGraphicsRectItem, QVBoxLayout, QWidget, QPushButton, QMessageBox, QStackedWidget, QLabel, QHBoxLayout, QSlider
-from PyQt6.QtMultimedia import QSoundEffect
-from PyQt6.QtCore import Qt, QUrl, QTimer
-from PyQt6.QtGui import QPen, QBrush, QPixmap, QIcon
+    QGraphicsRectItem, QGraphicsSimpleTextItem, QVBoxLayout, QWidget, QPushButton, QMessageBox, QStackedWidget, \
+    QLabel, QHBoxLayout, QSlider
+from PyQt6.QtCore import Qt, QTimer, QObject, QRunnable, QThreadPool, QRectF, pyqtSignal
+from PyQt6.QtGui import QPen, QBrush, QPixmap, QIcon, QPainter, QFont, QKeySequence
+
+import analysis
+import engine
+import profiling
+import records
+import search
+import sounds
+import tablebase
+
+IMPORTED = time.perf_counter()
+# Размер клетки в координатах сцены; на экране доска масштабируется под окно
+TILE_SIZE = 100
+DRAW_MESSAGES = {
+    'repetition': "Игра закончилась ничьей: позиция повторилась трижды.",
+    'no_progress': "Игра закончилась ничьей: слишком долго ни один игрок не продвигался к дому соперника.",
+    'move_limit': "Игра закончилась ничьей из-за превышения количества ходов.",
+}
+
+# Стили разбираются один раз: весь лист ставится на главное окно, а не
+# на каждую кнопку и доску отдельно
+WINDOW_STYLE = """
+    QMainWindow {
+        background: QLinearGradient(x1:0, y1:0, x2:1, y2:1,
+            stop:0 #8e44ad, stop:1 #3498db);
+    }
+    QPushButton {
+        font-size: 20px; 
+        background-color: rgba(255, 255, 255, 0.8);
+        border: 2px solid #ecf0f1;
+        border-radius: 20px; 
+        padding: 20px; 
+        color: #2c3e50;
+        font-weight: bold;
+        text-transform: uppercase;
+        min-width: 220px; 
+        min-height: 60px; 
+
+    }
+    QPushButton:hover {
+        background-color: rgba(255, 255, 255, 1);
+    }
+    QPushButton:pressed {
+        background-color: #bdc3c7;
+    }
+    QLabel {
+        font-size: 28px; /* Больше размер шрифта для лейбла */
+        color: #ecf0f1;
+        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+        font-weight: bold; /* Жирный шрифт */
+        margin-bottom: 20px;
+    }
+    QPushButton#backButton {
+        font-size: 16px;
+        border: 2px solid #7f8c8d;
+        border-radius: 10px;
+        padding: 10px;
+        background: #ecf0f1;
+    }
+    QLabel#levelLabel {
+        font-size: 20px; 
+        color: #2c3e50;
+        font-weight: bold;
+        text-transform: uppercase;
+        min-width: 220px; 
+        min-height: 60px;
+    }
+"""
+BOARD_STYLE = """
+    QGraphicsView {
+        background: lightgray;
+        border-radius: 34px; 
+    }
+    QSlider::groove:horizontal {
+        height: 8px;
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #bbdefb, stop:1 #0d47a1);
+        margin: 2px 0;
+    }
+    QSlider::handle:horizontal {
+        background: #0d47a1;
+        border: 1px solid #0d47a1;
+        width: 18px;
+        margin: -2px 0; 
+        border-radius: 9px;
+    }
+    QSlider::add-page:horizontal {
+        background: #5c6bc0;
+    }
+    QSlider::sub-page:horizontal {
+        background: #bbdefb;
+    }
+    QLabel#profileLabel {
+        font-size: 12px;
+    }
+"""
+
+
+def scoreText(score):
+    # Оценка с точки зрения ходящего игрока; выигрыш - число полуходов до него
+    if score >= search.MATE_BOUND:
+        return f"победа за {search.MATE - score}"
+    if score <= -search.MATE_BOUND:
+        return f"поражение за {search.MATE + score}"
+    return f"{score:+d}"
 
 
 class Piece(QGraphicsEllipseItem):
-    def __init__(self, board, x, y, color):
+    def __init__(self, board, x, y, color, side):
         super().__init__(-board.tile_size / 2, -board.tile_size / 2, board.tile_size - 2, board.tile_size - 2)
         self.board = board
         self.setPos(x * board.tile_size + board.tile_size / 2, y * board.tile_size + board.tile_size / 2)
         self.setBrush(QBrush(color))
         self.position = (x, y)
+        self.side = side
         self.mouse_down = False
         self.setFlags(QGraphicsEllipseItem.GraphicsItemFlag.ItemIsMovable)
         self.setFlag(QGraphicsEllipseItem.GraphicsItemFlag.ItemSendsGeometryChanges)
@@ -30,7 +139,9 @@ class Piece(QGraphicsEllipseItem):
     def move(self, x, y):
         self.setPos(x * self.board.tile_size + self.board.tile_size / 2,
                     y * self.board.tile_size + self.board.tile_size / 2)
+        self.board.unindexPiece(self)
         self.position = (int(x), int(y))
+        self.board.indexPiece(self)
 
 
 class MoveIndicator(QGraphicsRectItem):
@@ -40,6 +151,19 @@ class MoveIndicator(QGraphicsRectItem):
         self.setBrush(QBrush(Qt.GlobalColor.green))
         self.piece = piece
         self.board = board
+        # Оценка хода в режиме анализа
+        self.label = QGraphicsSimpleTextItem("", self)
+        font = QFont()
+        font.setPixelSize(board.tile_size // 4)
+        self.label.setFont(font)
+        self.label.setPos(board.tile_size // 10, board.tile_size // 10)
+
+    def place(self, x, y, piece, text="", best=False):
+        self.setPos(x * self.board.tile_size, y * self.board.tile_size)
+        self.piece = piece
+        self.label.setText(text)
+        self.setBrush(QBrush(Qt.GlobalColor.cyan if best else Qt.GlobalColor.green))
+        self.show()
 
     def mousePressEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
@@ -53,205 +177,395 @@ class MoveIndicator(QGraphicsRectItem):
             self.board.clearMoveIndicators()
 
 
+class SearchSignals(QObject):
+    progress = pyqtSignal(int, object)
+    finished = pyqtSignal(int, object)
+
+
+class AnalysisWorker(QRunnable):
+    # Углубление анализа позиции в фоне, пока его не остановят
+    def __init__(self, analyzer, position, token):
+        super().__init__()
+        self.analyzer = analyzer
+        self.searcher = analyzer.searcher()
+        self.position = position
+        self.token = token
+        self.signals = SearchSignals()
+
+    def stop(self):
+        self.searcher.stop()
+
+    def run(self):
+        for result in self.analyzer.deepen(self.position, self.searcher):
+            self.signals.progress.emit(self.token, result)
+        self.signals.finished.emit(self.token, None)
+
+
+class NetworkClient(QObject):
+    # Соединение с server.py: строки JSON в обе стороны. QtNetwork
+    # импортируется только для сетевой партии. Сервер отвечает на запросы
+    # по порядку, поэтому ответ (строка с полем "ok") приходит вместе со
+    # своим запросом из очереди requests, событие - с None
+    message = pyqtSignal(object, object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, host, port, parent=None):
+        super().__init__(parent)
+        from PyQt6.QtNetwork import QTcpSocket
+
+        self.socket = QTcpSocket(self)
+        self.pending = []
+        self.requests = []
+        self.socket.connected.connect(self.onConnected)
+        self.socket.readyRead.connect(self.onReadyRead)
+        self.socket.errorOccurred.connect(lambda _: self.failed.emit(self.socket.errorString()))
+        self.socket.connectToHost(host, port)
+
+    def send(self, **message):
+        data = (json.dumps(message, separators=(',', ':')) + '\n').encode()
+        self.requests.append(message)
+        if self.socket.state() == self.socket.SocketState.ConnectedState:
+            self.socket.write(data)
+        else:
+            self.pending.append(data)
+
+    def onConnected(self):
+        for data in self.pending:
+            self.socket.write(data)
+        self.pending.clear()
+
+    def onReadyRead(self):
+        while self.socket.canReadLine():
+            message = json.loads(bytes(self.socket.readLine()))
+            request = self.requests.pop(0) if 'ok' in message and self.requests else None
+            self.message.emit(message, request)
+
+    def close(self):
+        self.socket.disconnectFromHost()
+
+
+class SearchWorker(QRunnable):
+    # Поиск хода компьютера в пуле потоков, чтобы окно продолжало отрисовываться
+    def __init__(self, searcher, position, token):
+        super().__init__()
+        self.searcher = searcher
+        self.position = position
+        self.token = token
+        self.signals = SearchSignals()
+
+    def run(self):
+        budget = search.TIME_BUDGETS.get(self.position.variant.difficulty, 1.0)
+        result = self.searcher.search(self.position, time_limit=budget,
+                                      on_depth=lambda partial: self.signals.progress.emit(self.token, partial))
+        self.signals.finished.emit(self.token, result)
+
+
 class Board(QGraphicsView):
-    def __init__(self, color1, color2, app, game_instance, difficulty='hard'):
+    def __init__(self, color1, color2, app, game_instance, difficulty='hard', computer=False,
+                 size=engine.BOARD_SIZE):
         super().__init__()
         self.app = app
         self.scene = QGraphicsScene()
         self.game_instance = game_instance
         self.setScene(self.scene)
-        self.board_size = 8
-        self.move_count = 0
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.board_size = size
         self.color1 = color1
         self.color2 = color2
+        self.colors = (color1, color2)
         self.color_names = {
             Qt.GlobalColor.black: "Черные",
             Qt.GlobalColor.white: "Белые",
             Qt.GlobalColor.red: "Красные",
             Qt.GlobalColor.yellow: "Желтые",
         }
-        self.player = QSoundEffect()
-        self.winner = QSoundEffect()
-        self.current_player = color2
+        self.sounds = sounds.manager()
         self.difficulty = difficulty
+        self.position = engine.Position(difficulty, self.board_size)
+        # Компьютер играет за color1, человек ходит первым
+        self.computer_side = 0 if computer else None
+        self.searcher = search.Searcher() if computer else None
+        self.search_token = 0
+        self.search_worker = None
+        # Режим анализа: кэш оценок общий на всю сессию, поиск - в фоне
+        self.analyzer = None
+        self.analysis_token = 0
+        self.analysis_worker = None
+        self.analysis_on = False
         self.black = 0
         self.white = 0
+        # Партия пишется в файл записей один раз; в режиме просмотра - ходы записи
+        self.recorded = False
+        self.replay_moves = None
+        # Отмена и возврат ходов: (ход, начисленные очки) сделанных ходов и
+        # отменённые ходы; саму позицию откатывают Position.make/unmake
+        self.undo_stack = []
+        self.redo_stack = []
+        # Сетевая партия: соединение с сервером, сторона соперника и есть ли
+        # соперник в партии (до его входа сервер ходы не принимает)
+        self.remote = None
+        self.remote_side = None
+        self.remote_game = None
+        self.remote_ready = False
         self.volumeSlider = QSlider(Qt.Orientation.Horizontal)
-        self.volumeSlider.setStyleSheet("""
-                QSlider::groove:horizontal {
-                    height: 8px;
-                    background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #bbdefb, stop:1 #0d47a1);
-                    margin: 2px 0;
-                }
-                QSlider::handle:horizontal {
-                    background: #0d47a1;
-                    border: 1px solid #0d47a1;
-                    width: 18px;
-                    margin: -2px 0; 
-                    border-radius: 9px;
-                }
-                QSlider::add-page:horizontal {
-                    background: #5c6bc0;
-                }
-                QSlider::sub-page:horizontal {
-                    background: #bbdefb;
-                }
-                """)
         self.volumeSlider.setMinimum(0)
         self.level_selection_widget = None
-        self.sound_effect = QSoundEffect()
-        self.sound_effect.setSource(QUrl.fromLocalFile("click.wav"))
         self.volumeSlider.setMaximum(100)
         self.volumeSlider.setValue(50)
         self.volumeSlider.setTickPosition(QSlider.TickPosition.TicksAbove)
-        self.volumeSlider.valueChanged.connect(self.player.setVolume)
-        self.tile_size = 100
+        self.tile_size = TILE_SIZE
+        # Клетки доски рисуются один раз в pixmap и выводятся в drawBackground
+        self.background = None
+        self.background_key = None
+        # Пул подсветок ходов: элементы прячутся и переставляются, а не пересоздаются
+        self.indicators = []
+        self.active_indicators = 0
+        self.shown_piece = None
         self.pieces = []
+        # Индекс клетка -> фишка, чтобы не перебирать self.pieces при каждом запросе
+        self.piece_index = [None] * (self.board_size * self.board_size)
         self.initUI()
 
     def initUI(self):
         self.horizontalLayout = QHBoxLayout()
         self.controlPanelWidget = QWidget()
         self.controlPanelLayout = QVBoxLayout()
-        self.setStyleSheet("""
-            QGraphicsView {
-                background: lightgray;
-                border-radius: 34px; 
-            }
-        """)
         color_name_1 = self.color_names.get(self.color1)
         color_name_2 = self.color_names.get(self.color2)
         self.scoreLabel = QLabel(f"Счет: {color_name_1} - {self.black}, {color_name_2} - {self.white}")
         self.restartButton = QPushButton("Начать сначала")
         self.backButton = QPushButton("Передать ход")
-
-        self.controlPanelLayout.addWidget(self.scoreLabel)
+        self.undoButton = QPushButton("Отменить ход")
+        self.redoButton = QPushButton("Вернуть ход")
+        self.undoButton.setEnabled(False)
+        self.redoButton.setEnabled(False)
+        self.menuButton = QPushButton("В меню")
+        self.hintButton = QPushButton("Подсказка")
+        self.analysisButton = QPushButton("Анализ")
+        self.analysisButton.setCheckable(True)
+        self.replayBackButton = QPushButton("Ход назад")
+        self.replayForwardButton = QPushButton("Ход вперёд")
+        self.replayBackButton.hide()
+        self.replayForwardButton.hide()
+
+        self.thinkingLabel = QLabel("")
+        self.analysisLabel = QLabel("")
+        self.analysisLabel.hide()
+        self.scoreLayout = QHBoxLayout()
+        self.scoreLayout.addWidget(self.scoreLabel)
+        self.scoreLayout.addWidget(self.analysisLabel)
+        self.controlPanelLayout.addLayout(self.scoreLayout)
+        self.controlPanelLayout.addWidget(self.thinkingLabel)
+        if profiling.profiler is not None and profiling.profiler.overlay:
+            self.profileLabel = QLabel("")
+            self.profileLabel.setObjectName("profileLabel")
+            self.controlPanelLayout.addWidget(self.profileLabel)
+            self.profileTimer = QTimer(self)
+            self.profileTimer.timeout.connect(
+                lambda: self.profileLabel.setText(profiling.profiler.overlay_text()))
+            self.profileTimer.start(500)
         self.controlPanelLayout.addWidget(self.restartButton)
         self.controlPanelLayout.addWidget(self.backButton)
+        self.controlPanelLayout.addWidget(self.undoButton)
+        self.controlPanelLayout.addWidget(self.redoButton)
+        self.controlPanelLayout.addWidget(self.hintButton)
+        self.controlPanelLayout.addWidget(self.analysisButton)
+        self.controlPanelLayout.addWidget(self.replayBackButton)
+        self.controlPanelLayout.addWidget(self.replayForwardButton)
+        self.controlPanelLayout.addWidget(self.menuButton)
         self.controlPanelWidget.setLayout(self.controlPanelLayout)
         self.volumeSliderLayout = QVBoxLayout()
         self.volumeSliderLayout.addWidget(self.volumeSlider)
         self.controlPanelLayout.insertLayout(0, self.volumeSliderLayout)
         self.horizontalLayout.addWidget(self)
         self.horizontalLayout.addWidget(self.controlPanelWidget)
-        self.backgroundMusic = QSoundEffect()
-        self.backgroundMusic.setSource(QUrl.fromLocalFile("522.wav"))
-        self.backgroundMusic.setVolume(0.5)
-        self.backgroundMusic.setLoopCount(-2)
-        self.backgroundMusic.play()
+        self.sounds.play('music', sounds.INFINITE)
         self.volumeSlider.valueChanged.connect(self.setVolume)
-        mainLayoutWidget = QWidget()
-        mainLayoutWidget.setLayout(self.horizontalLayout)
-        self.app.setCentralWidget(mainLayoutWidget)
+        # Экран игры один на всю сессию, его показывает QStackedWidget окна Game
+        self.gameWidget = QWidget()
+        self.gameWidget.setStyleSheet(BOARD_STYLE)
+        self.gameWidget.setLayout(self.horizontalLayout)
 
         self.drawBoard()
-        self.placePieces()
-        self.player.setSource(QUrl.fromLocalFile("20.wav"))
-        self.winner.setSource(QUrl.fromLocalFile("52.wav"))
+        self.initBoardWithDifficulty()
 
         # Привязываем обработчики событий к кнопкам
         self.restartButton.clicked.connect(self.resetGame)
         self.backButton.clicked.connect(self.changePlayer)
+        self.undoButton.clicked.connect(self.undoMove)
+        self.redoButton.clicked.connect(self.redoMove)
+        self.menuButton.clicked.connect(self.leaveGame)
+        self.hintButton.clicked.connect(self.showHint)
+        self.analysisButton.toggled.connect(self.setAnalysis)
+        self.replayBackButton.clicked.connect(lambda: self.replayStep(-1))
+        self.replayForwardButton.clicked.connect(lambda: self.replayStep(1))
+
+    def newGame(self, color1, color2, difficulty, computer=False, size=engine.BOARD_SIZE):
+        # Повторное использование доски для следующей партии сессии
+        self.saveRecord(records.UNFINISHED)
+        self.stopReplay()
+        if size != self.board_size:
+            self.cancelSearch()
+            self.clearMoveIndicators()
+            self.board_size = size
+            self.clearBoard()
+            self.drawBoard()
+        self.color1 = color1
+        self.color2 = color2
+        self.colors = (color1, color2)
+        self.difficulty = difficulty
+        self.cancelSearch()
+        self.computer_side = 0 if computer else None
+        if computer and self.searcher is None:
+            self.searcher = search.Searcher()
+        self.resetGame()
+        self.sounds.play('music', sounds.INFINITE)
+
+    def leaveGame(self):
+        self.closeRemote()
+        self.saveRecord(records.UNFINISHED)
+        self.stopReplay()
+        self.cancelSearch()
+        self.stopAnalysis()
+        self.clearMoveIndicators()
+        self.sounds.stop('music')
+        self.game_instance.goToMainMenu1()
 
-    def checkWinCondition(self):
-        self.difficulty = 'classic'
-        color1_in_home = 0
-        color2_in_home = 0
+    @property
+    def current_player(self):
+        return self.colors[self.position.side]
 
-        for piece in self.pieces:
-            if self.isInOppositeCorner(piece.position, piece.brush().color()):
-                if piece.brush().color() == self.color1:
-                    color1_in_home += 1
-                elif piece.brush().color() == self.color2:
-                    color2_in_home += 1
-
-        if color1_in_home == 9:
-            return self.color1
-        elif color2_in_home == 9:
-            return self.color2
-        return None
+    @property
+    def move_count(self):
+        return self.position.ply
 
-    def checkMediumCondition(self):
-        self.difficulty = 'medium'
-        color1_in_target = 0
-        color2_in_target = 0
+    def toSquare(self, pos):
+        return engine.square(pos[0], pos[1], self.board_size)
 
-        target_positions_color1 = [(x, y) for y in range(self.board_size - 3, self.board_size) for x in
-                                   range(self.board_size - 4, self.board_size)]
-        target_positions_color2 = [(x, y) for y in range(3) for x in range(4)]
+    def toPoint(self, sq):
+        return engine.point(sq, self.board_size)
 
-        for piece in self.pieces:
-            piece_position = piece.position
-            piece_color = piece.brush().color()
-
-            if piece_color == self.color1 and piece_position in target_positions_color1:
-                color1_in_target += 1
-            elif piece_color == self.color2 and piece_position in target_positions_color2:
-                color2_in_target += 1
-
-        if color1_in_target == 1:
-            return self.color1
-        elif color2_in_target == 1:
-            return self.color2
-        return None
+    def winnerColor(self, side):
+        return None if side is None else self.colors[side]
 
-    def getValidMoves(self, piece):
-        moves = self.getValidJumps(piece)
-        x, y = piece.position
-        for dx in [-1, 1]:
-            if 0 <= x + dx < self.board_size and self.isFree((x + dx, y)):
-                moves.append((x + dx, y))
-            if 0 <= y + dx < self.board_size and self.isFree((x, y + dx)):
-                moves.append((x, y + dx))
+    def checkWinCondition(self):
+        return self.winnerColor(self.position.winner(engine.CLASSIC))
+
+    def checkMediumCondition(self):
+        return self.winnerColor(self.position.winner(engine.MEDIUM))
 
-        return moves
+    def getValidMoves(self, piece):
+        return [self.toPoint(to) for _, to in self.position.moves_from(self.toSquare(piece.position))]
 
     def getValidJumps(self, piece):
-        jumps = []
-        x, y = piece.position
-        for d in [-2, 2]:
-            if 0 <= x + d < self.board_size:
-                mid_x = x + d // 2
-                if self.getPieceAt(mid_x, y) and self.isFree((x + d, y)):
-                    jumps.append((x + d, y))
-            if 0 <= y + d < self.board_size:
-                mid_y = y + d // 2
-                if self.getPieceAt(x, mid_y) and self.isFree((x, y + d)):
-                    jumps.append((x, y + d))
-        return jumps
+        return [self.toPoint(to) for _, to in self.position.jumps_from(self.toSquare(piece.position))]
 
     def showMoves(self, piece):
-        if piece.brush().color() != self.current_player:
+        if (piece.side != self.position.side or self.isComputerTurn() or self.isRemoteTurn()
+                or self.replay_moves is not None):
             return
         self.clearMoveIndicators()
-        moves = self.getValidMoves(piece)
-        for move in moves:
-            if self.isFree(move):
-                indicator = MoveIndicator(move[0], move[1], self, piece)
-                self.scene.addItem(indicator)
+        moves = [move for move in self.getValidMoves(piece) if self.isFree(move)]
+        while len(self.indicators) < len(moves):
+            indicator = MoveIndicator(0, 0, self, None)
+            indicator.hide()
+            self.scene.addItem(indicator)
+            self.indicators.append(indicator)
+        scores = self.destinationScores(piece)
+        best = max(scores.values()) if scores else None
+        for indicator, move in zip(self.indicators, moves):
+            score = scores.get(move)
+            indicator.place(move[0], move[1], piece, "" if score is None else scoreText(score),
+                            score is not None and score == best)
+        self.active_indicators = len(moves)
+        self.shown_piece = piece
+
+    def destinationScores(self, piece):
+        # {клетка: оценка хода туда} из кэша анализа текущей позиции
+        result = self.analyzer.cached(self.position) if self.analysis_on else None
+        if result is None:
+            return {}
+        frm = self.toSquare(piece.position)
+        return {self.toPoint(move[1]): score for score, move in result.ranking if move[0] == frm}
+
+    def setAnalysis(self, enabled):
+        self.analysis_on = enabled
+        self.analysisLabel.setVisible(enabled)
+        if enabled and self.analyzer is None:
+            self.analyzer = analysis.Analyzer()
+            # Свой пул из одного потока: анализ не занимает потоки поиска компьютера,
+            # а остановленный анализ успевает завершиться до запуска следующего
+            self.analysis_pool = QThreadPool(self)
+            self.analysis_pool.setMaxThreadCount(1)
+            QApplication.instance().aboutToQuit.connect(self.stopAnalysis)
+        self.refreshAnalysis()
+
+    def stopAnalysis(self):
+        if self.analysis_worker is None:
+            return
+        # Результаты остановленного анализа отбрасываются по устаревшему token
+        self.analysis_worker.stop()
+        self.analysis_token += 1
+        self.analysis_worker = None
+
+    def refreshAnalysis(self):
+        # Позиция изменилась: показать готовую оценку из кэша и углублять её в фоне
+        self.stopAnalysis()
+        if not self.analysis_on:
+            return
+        if self.isComputerTurn() or self.position.winner() is not None:
+            self.analysisLabel.setText("")
+            return
+        cached = self.analyzer.cached(self.position)
+        self.showAnalysis(cached)
+        if cached is not None and (cached.depth >= self.analyzer.max_depth or not cached.ranking
+                                   or abs(cached.ranking[0][0]) >= search.MATE_BOUND):
+            return
+        self.analysis_token += 1
+        self.analysis_worker = AnalysisWorker(self.analyzer, self.position.copy(), self.analysis_token)
+        self.analysis_worker.signals.progress.connect(self.onAnalysisProgress)
+        self.analysis_worker.signals.finished.connect(self.onAnalysisFinished)
+        self.analysis_pool.start(self.analysis_worker)
+
+    def onAnalysisProgress(self, token, result):
+        if token != self.analysis_token:
+            return
+        self.showAnalysis(result)
+        # Подсветка ходов выбранной фишки получает оценки новой глубины
+        if self.active_indicators and self.shown_piece is not None:
+            self.showMoves(self.shown_piece)
+
+    def onAnalysisFinished(self, token, result):
+        if token == self.analysis_token:
+            self.analysis_worker = None
+
+    def showAnalysis(self, result):
+        if result is None:
+            self.analysisLabel.setText("Анализ...")
+            return
+        if not result.ranking:
+            self.analysisLabel.setText("Ходов нет, нужно передать ход")
+            return
+        score, (frm, to) = result.ranking[0]
+        (x1, y1), (x2, y2) = self.toPoint(frm), self.toPoint(to)
+        self.analysisLabel.setText(f"Лучший ход: ({x1 + 1}, {y1 + 1}) → ({x2 + 1}, {y2 + 1}), "
+                                   f"оценка {scoreText(score)}, глубина {result.depth}")
 
     def movePiece(self, piece, new_pos):
-        if self.getPieceAt(new_pos[0], new_pos[1]) is None and piece.brush().color() == self.current_player:
-            piece.move(new_pos[0], new_pos[1])
-            piece.position = new_pos
-            if self.isInOppositeCorner(piece.position, piece.brush().color()):
-                if piece.brush().color() == self.color1:
-                    self.black += 1
-                else:
-                    self.white += 1
-            if self.current_player == self.color2:
-                self.current_player = self.color1
-                self.white += 1
-                self.updateStatusBar()
-                QTimer.singleShot(0, self.player.play)
-            else:
-                self.current_player = self.color2
-                self.black += 1
-                self.updateStatusBar()
-                QTimer.singleShot(0, self.player.play)
-            self.move_count += 1
-            if self.move_count >= 80:
-                self.declareDraw()
+        move = (self.toSquare(piece.position), self.toSquare(new_pos))
+        if piece.side == self.position.side and self.position.is_legal(move):
+            self.redo_stack.clear()
+            self.playMove(move)
+            self.updateStatusBar()
+            QTimer.singleShot(0, lambda: self.sounds.play('move'))
+            if self.remote is not None:
+                # Итог партии решает сервер: он придёт в ответе на ход
+                self.remote.send(op='move', game=self.remote_game, **{'from': move[0], 'to': move[1]})
+                return
+            reason = self.position.draw_reason()
+            if reason is not None:
+                self.declareDraw(reason)
                 return
         if self.difficulty == 'classic':
             winner = self.checkWinCondition()
@@ -259,48 +573,164 @@ class Board(QGraphicsView):
             winner = self.checkMediumCondition()
         else:
             winner = self.checkHardCondition()
-        if winner:
+        if winner is not None:
             self.declareWinner(winner)
+        elif self.isComputerTurn():
+            QTimer.singleShot(0, self.computerMove)
+
+    def showHint(self):
+        # Идеальный ход из таблицы окончаний, если позиция в ней есть
+        table = tablebase.load(self.difficulty, self.board_size)
+        hint = table.best_move(self.position) if table is not None else None
+        if hint is None:
+            self.thinkingLabel.setText("Подсказка доступна только в концовке")
+            return
+        (frm, to), moves = hint
+        (x1, y1), (x2, y2) = self.toPoint(frm), self.toPoint(to)
+        self.thinkingLabel.setText(
+            f"Лучший ход: ({x1 + 1}, {y1 + 1}) → ({x2 + 1}, {y2 + 1}), до победы ходов: {moves}")
+
+    def isRemoteTurn(self):
+        # Ходить нельзя и пока соперника нет в партии
+        return self.remote is not None and (not self.remote_ready or self.position.side == self.remote_side)
+
+    def connectRemote(self, host, port, game_id=None):
+        # Новая партия на сервере (мы ходим первыми) или вход в партию game_id
+        self.closeRemote()
+        self.remote = NetworkClient(host, port, self)
+        self.remote.message.connect(self.onRemoteMessage)
+        self.remote.failed.connect(lambda error: self.thinkingLabel.setText(f"Нет связи с сервером: {error}"))
+        if game_id is None:
+            self.remote.send(op='new', difficulty=self.difficulty, size=self.board_size, side=1)
+        else:
+            self.remote.send(op='join', game=game_id)
+        self.setNetworkControls(True)
+        self.thinkingLabel.setText("Подключение к серверу...")
 
-    def declareDraw(self):
+    def closeRemote(self):
+        if self.remote is None:
+            return
+        self.remote.close()
+        self.remote.deleteLater()
+        self.remote = None
+        self.remote_side = None
+        self.remote_game = None
+        self.remote_ready = False
+        self.setNetworkControls(False)
+
+    def setNetworkControls(self, network):
+        # Ходы в сетевой партии не отменяются: позицию ведёт сервер
+        self.restartButton.setVisible(not network)
+        self.undoButton.setVisible(not network)
+        self.redoButton.setVisible(not network)
+
+    def onRemoteMessage(self, message, request):
+        if message.get('ok') is False:
+            self.thinkingLabel.setText(f"Сервер: {message['error']}")
+            if request is not None and request['op'] in ('move', 'pass') and self.undo_stack:
+                # Сервер не принял наш ход: он возвращается на доске
+                self.clearMoveIndicators()
+                self.takeBack()
+                self.updateStatusBar()
+        elif 'you' in message:
+            if (message['difficulty'], message['size']) != (self.difficulty, self.board_size):
+                self.newGame(self.color1, self.color2, message['difficulty'], size=message['size'])
+            # Позиция - та, что на сервере, а не стартовая
+            self.position = engine.Position.from_state((message['difficulty'], message['size'], *message['masks'],
+                                                        message['side'], message['ply']))
+            self.undo_stack = []
+            self.redo_stack = []
+            self.clearMoveIndicators()
+            self.placePieces()
+            self.remote_game = message['game']
+            self.remote_side = 1 - message['you']
+            self.remote_ready = request is not None and request['op'] == 'join'
+            waiting = "" if self.remote_ready else " - ждём соперника"
+            self.thinkingLabel.setText(f"Сетевая партия {self.remote_game}{waiting}")
+        elif message.get('event') == 'joined':
+            self.remote_ready = True
+            self.thinkingLabel.setText(f"Сетевая партия {self.remote_game}: соперник подключился")
+        elif message.get('event') == 'left':
+            self.remote_ready = False
+            self.thinkingLabel.setText(f"Сетевая партия {self.remote_game}: соперник отключился")
+        elif message.get('event') == 'move' and self.isRemoteTurn():
+            move = message['move']
+            self.clearMoveIndicators()
+            self.playMove(None if move is None else tuple(move))
+            self.updateStatusBar()
+            if move is not None:
+                QTimer.singleShot(0, lambda: self.sounds.play('move'))
+            self.remoteResult(message)
+        elif request is not None and request['op'] in ('move', 'pass'):
+            self.remoteResult(message)
+
+    def remoteResult(self, message):
+        # Победа или ничья по решению сервера
+        if message['winner'] is not None:
+            self.declareWinner(self.winnerColor(message['winner']))
+        elif message['draw'] is not None:
+            self.declareDraw(message['draw'])
+
+    def isComputerTurn(self):
+        return self.computer_side is not None and self.position.side == self.computer_side
+
+    def computerMove(self):
+        if not self.isComputerTurn() or self.search_worker is not None:
+            return
+        self.search_token += 1
+        self.search_worker = SearchWorker(self.searcher, self.position.copy(), self.search_token)
+        self.search_worker.signals.progress.connect(self.onSearchProgress)
+        self.search_worker.signals.finished.connect(self.onSearchFinished)
+        self.thinkingLabel.setText("Компьютер думает...")
+        QThreadPool.globalInstance().start(self.search_worker)
+
+    def cancelSearch(self):
+        if self.search_worker is None:
+            return
+        # Результат отменённого поиска отбрасывается по устаревшему token
+        self.searcher.stop()
+        self.search_token += 1
+        self.searcher = search.Searcher(tt=self.searcher.tt)
+        self.search_worker = None
+        self.thinkingLabel.setText("")
+
+    def onSearchProgress(self, token, result):
+        if token == self.search_token:
+            self.thinkingLabel.setText(f"Компьютер думает... глубина {result.depth}")
+
+    def onSearchFinished(self, token, result):
+        if token != self.search_token:
+            return
+        self.search_worker = None
+        self.thinkingLabel.setText("")
+        if not self.isComputerTurn():
+            return
+        if result.move is None:
+            self.changePlayer()
+            return
+        frm, to = result.move
+        piece = self.getPieceAt(*self.toPoint(frm))
+        self.movePiece(piece, self.toPoint(to))
+
+    def declareDraw(self, reason):
+        self.closeRemote()
+        self.saveRecord(records.DRAW)
         msg = QMessageBox()
         msg.setWindowTitle("Ничья!")
-        msg.setText("Игра закончилась ничьей из-за превышения количества ходов.")
+        msg.setText(DRAW_MESSAGES[reason])
         msg.setStandardButtons(QMessageBox.StandardButton.Ok)
         answer = msg.exec()
         if answer == QMessageBox.StandardButton.Ok:
             self.resetGame()
 
     def checkHardCondition(self):
-        self.difficulty = 'hard'
-        start_diagonal = 4
-        color1_in_target_positions = 0
-        color2_in_target_positions = 0
-
-        target_positions_color1 = [(x, y) for y in range(self.board_size) for x in range(self.board_size) if
-                                   x + y >= self.board_size + start_diagonal - 2]
-        target_positions_color2 = [(x, y) for y in range(self.board_size) for x in range(self.board_size) if
-                                   x + y <= self.board_size - start_diagonal]
-
-        for piece in self.pieces:
-            piece_position = piece.position
-            piece_color = piece.brush().color()
-
-            if piece_color == self.color1 and piece_position in target_positions_color1:
-                color1_in_target_positions += 1
-            elif piece_color == self.color2 and piece_position in target_positions_color2:
-                color2_in_target_positions += 1
-
-        if color1_in_target_positions == 15:
-            return self.color1
-        elif color2_in_target_positions == 15:
-            return self.color2
-
-        return None
+        return self.winnerColor(self.position.winner(engine.HARD))
 
     def declareWinner(self, winner_color):
-        self.player.stop()
-        self.winner.play()
+        self.closeRemote()
+        self.saveRecord(self.colors.index(winner_color))
+        self.sounds.stop('move')
+        self.sounds.play('win')
         winner = "Первый игрок" if winner_color == self.color1 else "Второй игрок"
         msg = QMessageBox()
         msg.setWindowTitle("Победа!")
@@ -316,160 +746,293 @@ class Board(QGraphicsView):
             sys.exit(0)
 
     def resetGame(self):
+        self.saveRecord(records.UNFINISHED)
+        self.cancelSearch()
+        self.clearMoveIndicators()
         self.black = 0
         self.white = 0
-        self.current_player = self.color2
-        self.clearBoard()
         self.initBoardWithDifficulty()
         self.updateStatusBar()
 
     def initBoardWithDifficulty(self):
-        positions_color1 = []
-        positions_color2 = []
+        self.position = engine.Position(self.difficulty, self.board_size)
+        self.recorded = False
+        self.undo_stack = []
+        self.redo_stack = []
+        self.placePieces()
 
-        if self.difficulty == 'classic':
-            for y in range(3):
-                for x in range(3):
-                    positions_color1.append((x, y))
-                    positions_color2.append((self.board_size - 1 - x, self.board_size - 1 - y))
-        elif self.difficulty == 'medium':
-            for y in range(3):
-                for x in range(4):
-                    positions_color1.append((x, y))
-                    positions_color2.append((self.board_size - 1 - x, self.board_size - 1 - y))
+    def placePieces(self):
+        # Фишки прошлой партии переставляются на стартовые клетки; создаются
+        # и удаляются только недостающие и лишние при смене расстановки
+        self.piece_index = [None] * (self.board_size * self.board_size)
+        existing = ([], [])
+        for piece in self.pieces:
+            existing[piece.side].append(piece)
+        self.pieces = []
+        for side, color in enumerate(self.colors):
+            squares = list(engine.squares(self.position.masks[side]))
+            for piece in existing[side][len(squares):]:
+                self.scene.removeItem(piece)
+            for piece, sq in zip(existing[side], squares):
+                piece.setBrush(QBrush(color))
+                piece.move(*self.toPoint(sq))
+                self.pieces.append(piece)
+            for sq in squares[len(existing[side]):]:
+                self.create_piece(self.toPoint(sq), color)
+
+    def playMove(self, move):
+        # Ход (None - пропуск хода) с начислением очков; takeBack отменяет его
+        side = self.position.side
+        points = 1
+        if move is None:
+            self.position.make_pass()
         else:
-            start_diagonal = 4
-            for y in range(self.board_size):
-                for x in range(self.board_size):
-                    if x + y <= self.board_size - start_diagonal:
-                        positions_color1.append((x, y))
-                    elif x + y >= self.board_size + start_diagonal - 2:
-                        positions_color2.append((x, y))
+            self.position.make(move)
+            self.getPieceAt(*self.toPoint(move[0])).move(*self.toPoint(move[1]))
+            # За ход в угол соперника - ещё очко
+            points += self.position.in_corner(move[1], side)
+        self.addPoints(side, points)
+        self.undo_stack.append((move, points))
+
+    def takeBack(self):
+        move, points = self.undo_stack.pop()
+        self.position.unmake()
+        if move is not None:
+            self.getPieceAt(*self.toPoint(move[1])).move(*self.toPoint(move[0]))
+        self.addPoints(self.position.side, -points)
+        return move
+
+    def addPoints(self, side, points):
+        if side == 0:
+            self.black += points
+        else:
+            self.white += points
 
-        self.placePiecesWithPositions(positions_color1, self.color1)
-        self.placePiecesWithPositions(positions_color2, self.color2)
+    def undoMove(self):
+        if self.replay_moves is not None or self.remote is not None or not self.undo_stack:
+            return
+        self.cancelSearch()
+        self.clearMoveIndicators()
+        self.redo_stack.append(self.takeBack())
+        # Против компьютера откат до хода человека
+        while self.isComputerTurn() and self.undo_stack:
+            self.redo_stack.append(self.takeBack())
+        self.updateStatusBar()
+        if self.isComputerTurn():
+            QTimer.singleShot(0, self.computerMove)
 
-    def placePiecesWithPositions(self, positions, color):
-        for position in positions:
-            self.create_piece(position, color)
+    def redoMove(self):
+        if self.replay_moves is not None or self.remote is not None or not self.redo_stack:
+            return
+        self.cancelSearch()
+        self.clearMoveIndicators()
+        self.playMove(self.redo_stack.pop())
+        while self.isComputerTurn() and self.redo_stack:
+            self.playMove(self.redo_stack.pop())
+        self.updateStatusBar()
+        if self.isComputerTurn():
+            QTimer.singleShot(0, self.computerMove)
 
     def clearBoard(self):
         for piece in self.pieces:
             self.scene.removeItem(piece)
         self.pieces.clear()
+        self.piece_index = [None] * (self.board_size * self.board_size)
+
+    def saveRecord(self, result):
+        path = self.game_instance.record_path
+        if path is None or self.recorded or self.replay_moves is not None or self.position.ply == 0:
+            return
+        self.recorded = True
+        records.append_game(path, self.position, (self.color1.value, self.color2.value), result)
+
+    def startReplay(self, moves):
+        # Просмотр записанной партии: ходы только кнопками и стрелками, фишки не кликаются
+        self.cancelSearch()
+        self.computer_side = None
+        self.resetGame()
+        self.replay_moves = moves
+        self.setReplayControls(True)
+        self.updateReplayLabel()
+
+    def stopReplay(self):
+        if self.replay_moves is None:
+            return
+        self.replay_moves = None
+        # Просмотренная партия уже есть в файле записей: resetGame не должен дописать её снова
+        self.recorded = True
+        self.setReplayControls(False)
+        self.thinkingLabel.setText("")
+
+    def setReplayControls(self, replay):
+        self.restartButton.setVisible(not replay)
+        self.backButton.setVisible(not replay)
+        self.undoButton.setVisible(not replay)
+        self.redoButton.setVisible(not replay)
+        self.replayBackButton.setVisible(replay)
+        self.replayForwardButton.setVisible(replay)
+
+    def replayStep(self, delta):
+        if self.replay_moves is None:
+            return
+        if delta > 0 and self.position.ply < len(self.replay_moves):
+            self.playMove(self.replay_moves[self.position.ply])
+        elif delta < 0 and self.position.ply > 0:
+            self.takeBack()
+        self.updateStatusBar()
+        self.updateReplayLabel()
+
+    def updateReplayLabel(self):
+        self.thinkingLabel.setText(f"Запись: ход {self.position.ply} из {len(self.replay_moves)}")
+
+    def keyPressEvent(self, event):
+        if self.replay_moves is not None and event.key() in (Qt.Key.Key_Left, Qt.Key.Key_Right):
+            self.replayStep(1 if event.key() == Qt.Key.Key_Right else -1)
+        elif event.matches(QKeySequence.StandardKey.Undo):
+            self.undoMove()
+        elif event.matches(QKeySequence.StandardKey.Redo):
+            self.redoMove()
+        else:
+            super().keyPressEvent(event)
 
     def isFree(self, pos):
         return self.getPieceAt(*pos) is None
 
     def changePlayer(self):
-        if self.current_player == self.color1:
-            self.black += 1
-        else:
-            self.white += 1
-        self.current_player = self.color1 if self.current_player == self.color2 else self.color2
-        self.move_count += 1
+        if self.isRemoteTurn():
+            return
+        self.cancelSearch()
+        self.redo_stack.clear()
+        self.playMove(None)
         self.updateStatusBar()
-        if self.move_count >= 80:
-            self.declareDraw()
+        if self.remote is not None:
+            self.remote.send(op='pass', game=self.remote_game)
+            return
+        reason = self.position.draw_reason()
+        if reason is not None:
+            self.declareDraw(reason)
+        elif self.isComputerTurn():
+            QTimer.singleShot(0, self.computerMove)
 
     def getPieceAt(self, x, y):
-        for piece in self.pieces:
-            if piece.position == (x, y):
-                return piece
+        if 0 <= x < self.board_size and 0 <= y < self.board_size:
+            return self.piece_index[y * self.board_size + x]
         return None
 
+    def indexPiece(self, piece):
+        self.piece_index[self.toSquare(piece.position)] = piece
+
+    def unindexPiece(self, piece):
+        sq = self.toSquare(piece.position)
+        if self.piece_index[sq] is piece:
+            self.piece_index[sq] = None
+
     def updateStatusBar(self):
         color_name_1 = self.color_names.get(self.color1)
         color_name_2 = self.color_names.get(self.color2)
         self.statusText = f"Счет: {color_name_1} - {self.black}, {color_name_2} - {self.white}"
         self.scoreLabel.setText(self.statusText)
+        self.undoButton.setEnabled(bool(self.undo_stack))
+        self.redoButton.setEnabled(bool(self.redo_stack))
+        self.refreshAnalysis()
 
     def drawBoard(self):
         self.scene.clear()
+        self.indicators = []
+        self.active_indicators = 0
+        # +1, чтобы в сцену попали правая и нижняя рамки доски
+        side = self.board_size * self.tile_size + 1
+        self.scene.setSceneRect(0, 0, side, side)
+        self.background = None
+        self.resetCachedContent()
+        self.fitBoard()
+        self.viewport().update()
+
+    def renderBackground(self):
+        # Перерисовка только при смене размера доски или масштаба вида
+        scale = self.transform().m11() * self.devicePixelRatioF()
+        key = (self.board_size, self.tile_size, scale)
+        if self.background is not None and self.background_key == key:
+            return self.background
+        # +1 пиксель, чтобы правая и нижняя рамки не обрезались
+        side = self.board_size * self.tile_size + 1
+        pixmap = QPixmap(round(side * scale), round(side * scale))
+        pixmap.setDevicePixelRatio(self.devicePixelRatioF())
+        painter = QPainter(pixmap)
+        painter.scale(scale / self.devicePixelRatioF(), scale / self.devicePixelRatioF())
+        painter.setPen(QPen(Qt.GlobalColor.black))
         for x in range(self.board_size):
             for y in range(self.board_size):
                 color = Qt.GlobalColor.gray if (x + y) % 2 == 0 else Qt.GlobalColor.lightGray
-                self.scene.addRect(x * self.tile_size, y * self.tile_size,
-                                   self.tile_size, self.tile_size,
-                                   QPen(Qt.GlobalColor.black), color)
-
-    def placePieces(self):
-        for y in range(3):
-            for x in range(3):
-                self.create_piece((x, y), self.color1)
-                self.create_piece((self.board_size - 1 - x, self.board_size - 1 - y), self.color2)
+                painter.setBrush(color)
+                painter.drawRect(x * self.tile_size, y * self.tile_size, self.tile_size, self.tile_size)
+        painter.end()
+        self.background = pixmap
+        self.background_key = key
+        return pixmap
+
+    def fitBoard(self):
+        # Клетки масштабируются под размер окна; фон перерисуется под новый масштаб
+        self.fitInView(self.scene.sceneRect(), Qt.AspectRatioMode.KeepAspectRatio)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.fitBoard()
+
+    def drawBackground(self, painter, rect):
+        super().drawBackground(painter, rect)
+        side = self.board_size * self.tile_size + 1
+        pixmap = self.renderBackground()
+        painter.drawPixmap(QRectF(0, 0, side, side), pixmap, QRectF(pixmap.rect()))
 
     def create_piece(self, position, color):
-        piece = Piece(self, position[0], position[1], color)
+        piece = Piece(self, position[0], position[1], color, 0 if color == self.color1 else 1)
         self.pieces.append(piece)
+        self.indexPiece(piece)
         self.scene.addItem(piece)
 
     def clearMoveIndicators(self):
-        for item in list(self.scene.items()):
-            if isinstance(item, MoveIndicator):
-                self.scene.removeItem(item)
+        for indicator in self.indicators[:self.active_indicators]:
+            indicator.hide()
+            indicator.piece = None
+        self.active_indicators = 0
+        self.shown_piece = None
 
     def isInOppositeCorner(self, position, color):
-        x, y = position
-        if color == self.color1:
-            return x >= self.board_size - 3 and y >= self.board_size - 3
-        else:
-            return x < 3 and y < 3
+        return self.position.in_corner(self.toSquare(position), 0 if color == self.color1 else 1)
 
     def setVolume(self, value):
         volumeLevel = value / 100
-        self.player.setVolume(volumeLevel)
-        self.backgroundMusic.setVolume(volumeLevel)
+        self.sounds.setVolume(volumeLevel)
 
 
 class Game(QMainWindow):
-    def __init__(self):
+    def __init__(self, record_path=None):
         super().__init__()
+        # Файл, куда дописываются сыгранные партии (--record)
+        self.record_path = record_path
         self.setGeometry(100, 100, 1000, 900)
         self.setMinimumWidth(1690)
         self.setMinimumHeight(900)
-        self.setStyleSheet("""
-            QMainWindow {
-                background: QLinearGradient(x1:0, y1:0, x2:1, y2:1,
-                    stop:0 #8e44ad, stop:1 #3498db);
-            }
-            QPushButton {
-                font-size: 20px; 
-                background-color: rgba(255, 255, 255, 0.8);
-                border: 2px solid #ecf0f1;
-                border-radius: 20px; 
-                padding: 20px; 
-                color: #2c3e50;
-                font-weight: bold;
-                text-transform: uppercase;
-                min-width: 220px; 
-                min-height: 60px; 
-
-            }
-            QPushButton:hover {
-                background-color: rgba(255, 255, 255, 1);
-            }
-            QPushButton:pressed {
-                background-color: #bdc3c7;
-            }
-            QLabel {
-                font-size: 28px; /* Больше размер шрифта для лейбла */
-                color: #ecf0f1;
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                font-weight: bold; /* Жирный шрифт */
-                margin-bottom: 20px;
-            }
-        """)
+        self.setStyleSheet(WINDOW_STYLE)
         self.central_widget = QStackedWidget()
         self.setCentralWidget(self.central_widget)
+        self.board = None
+        # Остальные экраны строятся при первом переходе на них
+        self.rules_widget = None
+        self.color_selection_widget = None
+        self.position_choice_widget = None
+        self.selected_colors = (Qt.GlobalColor.black, Qt.GlobalColor.white)
+        self.board_size = engine.BOARD_SIZE
+        # Сервер сетевых партий, "host:port" (--connect); None - порт по умолчанию на этом компьютере
+        self.server_address = None
 
         self.setWindowTitle("Уголки")
 
         self.menu_widget = QWidget()
         self.menu_layout = QVBoxLayout()
 
-        self.sound_effect = QSoundEffect()
-        self.sound_effect.setSource(QUrl.fromLocalFile("click.wav"))
+        self.sounds = sounds.manager()
 
         self.play_button = QPushButton("Играть")
         self.options_button = QPushButton("Правила")
@@ -485,19 +1048,9 @@ class Game(QMainWindow):
             self.menu_layout.addSpacing(50)
         self.menu_widget.setLayout(self.menu_layout)
 
-        self.initRulesWidget()
-        self.initColorSelectionWidget()
-
         self.central_widget.addWidget(self.menu_widget)
-        self.central_widget.addWidget(self.color_selection_widget)
-        self.central_widget.addWidget(self.rules_widget)
 
         self.play_button.clicked.connect(self.openColorSelection)
-        self.classic_colors_button.clicked.connect(
-            lambda: self.openPositionChoice(Qt.GlobalColor.black, Qt.GlobalColor.white))
-        self.custom_colors_button.clicked.connect(
-            lambda: self.openPositionChoice(Qt.GlobalColor.red, Qt.GlobalColor.yellow))
-        self.rules_back_button.clicked.connect(self.goToMainMenu1)
         self.options_button.clicked.connect(self.goToRules)
         self.exit_button.clicked.connect(self.closeGame)
 
@@ -521,6 +1074,7 @@ class Game(QMainWindow):
         self.setupBackButton(back_button_layout, self.goToMainMenu1)
         self.rules_layout.addLayout(back_button_layout)
         self.rules_widget.setLayout(self.rules_layout)
+        self.central_widget.addWidget(self.rules_widget)
 
     def initColorSelectionWidget(self):
         self.color_selection_widget = QWidget()
@@ -536,16 +1090,21 @@ class Game(QMainWindow):
 
         back_button_layout = QHBoxLayout()
 
-        self.setupBackButton(back_button_layout, lambda: self.central_widget.setCurrentWidget(self.menu_widget))
+        self.setupBackButton(back_button_layout, self.goToMainMenu1)
 
         self.color_selection_layout.addLayout(back_button_layout)
 
         self.color_selection_widget.setLayout(self.color_selection_layout)
+        self.central_widget.addWidget(self.color_selection_widget)
+
+        self.classic_colors_button.clicked.connect(
+            lambda: self.openPositionChoice(Qt.GlobalColor.black, Qt.GlobalColor.white))
+        self.custom_colors_button.clicked.connect(
+            lambda: self.openPositionChoice(Qt.GlobalColor.red, Qt.GlobalColor.yellow))
 
     def closeGame(self):
-        self.playSoundEffect()
-        time.sleep(0.1)
-        sys.exit(0)
+        # Выход после щелчка, не блокируя поток интерфейса
+        self.sounds.playThen('click', QApplication.quit)
 
     def goToMainMenu1(self):
         self.playSoundEffect()
@@ -553,18 +1112,28 @@ class Game(QMainWindow):
 
     def goToRules(self):
         self.playSoundEffect()
+        if self.rules_widget is None:
+            self.initRulesWidget()
         self.central_widget.setCurrentWidget(self.rules_widget)
 
     def playSoundEffect(self):
-        self.sound_effect.play()
+        self.sounds.play('click')
 
     def openColorSelection(self):
         self.playSoundEffect()
+        if self.color_selection_widget is None:
+            self.initColorSelectionWidget()
         self.central_widget.setCurrentWidget(self.color_selection_widget)
 
     def openPositionChoice(self, color1, color2):
         self.playSoundEffect()
-        position_choice_widget = QWidget()
+        self.selected_colors = (color1, color2)
+        if self.position_choice_widget is None:
+            self.initPositionChoiceWidget()
+        self.central_widget.setCurrentWidget(self.position_choice_widget)
+
+    def initPositionChoiceWidget(self):
+        self.position_choice_widget = QWidget()
         main_layout = QVBoxLayout()
 
         header_label = QLabel("Выберите уровень сложности")
@@ -580,8 +1149,21 @@ class Game(QMainWindow):
         buttons_layout.addWidget(random_position_button)
         buttons_layout.addWidget(custom_position_button)
 
+        self.computer_button = QPushButton("Против компьютера")
+        self.computer_button.setCheckable(True)
+        # Уровень выбранной кнопки - новая партия на сервере, соперник входит в неё
+        self.network_button = QPushButton("По сети")
+        self.network_button.setCheckable(True)
+        self.computer_button.toggled.connect(lambda checked: checked and self.network_button.setChecked(False))
+        self.network_button.toggled.connect(lambda checked: checked and self.computer_button.setChecked(False))
+        self.size_button = QPushButton(self.sizeText())
+        self.size_button.clicked.connect(self.nextBoardSize)
+
         buttons_centered_layout = QVBoxLayout()
         buttons_centered_layout.addLayout(buttons_layout)
+        buttons_centered_layout.addWidget(self.computer_button, 0, Qt.AlignmentFlag.AlignCenter)
+        buttons_centered_layout.addWidget(self.network_button, 0, Qt.AlignmentFlag.AlignCenter)
+        buttons_centered_layout.addWidget(self.size_button, 0, Qt.AlignmentFlag.AlignCenter)
         buttons_centered_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
 
         main_layout.addWidget(header_label)
@@ -593,54 +1175,62 @@ class Game(QMainWindow):
         self.setupBackButton(back_button_layout, self.openColorSelection)
         main_layout.addLayout(back_button_layout)
 
-        position_choice_widget.setLayout(main_layout)
-        self.central_widget.addWidget(position_choice_widget)
-        self.central_widget.setCurrentWidget(position_choice_widget)
+        self.position_choice_widget.setLayout(main_layout)
+        self.central_widget.addWidget(self.position_choice_widget)
 
         classic_position_button.clicked.connect(
-            lambda: self.startGame(color1, color2, 'classic'))
+            lambda: self.startGame(*self.selected_colors, 'classic', self.computer_button.isChecked(),
+                                   network=self.network_button.isChecked()))
         random_position_button.clicked.connect(
-            lambda: self.startGame(color1, color2, 'medium'))
+            lambda: self.startGame(*self.selected_colors, 'medium', self.computer_button.isChecked(),
+                                   network=self.network_button.isChecked()))
         custom_position_button.clicked.connect(
-            lambda: self.startGame(color1, color2, 'hard'))
+            lambda: self.startGame(*self.selected_colors, 'hard', self.computer_button.isChecked(),
+                                   network=self.network_button.isChecked()))
 
-    def startGame(self, color1, color2, difficulty):
-        self.playSoundEffect()
-        self.board_size = 8
-        positions_color1 = []
-        positions_color2 = []
-
-        if difficulty == 'classic':
-            for y in range(3):
-                for x in range(3):
-                    positions_color1.append((x, y))
-                    positions_color2.append((self.board_size - 1 - x, self.board_size - 1 - y))
-        elif difficulty == 'medium':
-            for y in range(3):
-                for x in range(4):
-                    positions_color1.append((x, y))
-                    positions_color2.append((self.board_size - 1 - x, self.board_size - 1 - y))
-        else:
-            start_diagonal = 4
-            for y in range(self.board_size):
-                for x in range(self.board_size):
-                    if x + y <= self.board_size - start_diagonal:
-                        positions_color1.append((x, y))
-                    elif x + y >= self.board_size + start_diagonal - 2:
-                        positions_color2.append((x, y))
+    def sizeText(self):
+        return f"Доска {self.board_size}×{self.board_size}"
 
-        self.openGameBoard(color1, color2, positions_color1, positions_color2, difficulty)
+    def nextBoardSize(self):
+        sizes = engine.BOARD_SIZES
+        index = sizes.index(self.board_size) if self.board_size in sizes else -1
+        self.board_size = sizes[(index + 1) % len(sizes)]
+        self.size_button.setText(self.sizeText())
 
-    def openGameBoard(self, color1, color2, positions_color1, positions_color2, difficulty):
-        board = Board(color1, color2, self, self, difficulty)
-        board.pieces = []
-        board.drawBoard()
-        for position in positions_color1:
-            board.create_piece(position, color1)
-        for position in positions_color2:
-            board.create_piece(position, color2)
+    def startGame(self, color1, color2, difficulty, computer=False, size=None, network=False):
+        self.playSoundEffect()
+        if network:
+            self.openNetworkGame(self.server_address, difficulty=difficulty, size=size)
+            return
+        self.openGameBoard(color1, color2, difficulty, computer, size or self.board_size)
 
-        self.central_widget.setCurrentWidget(board)
+    def openGameBoard(self, color1, color2, difficulty, computer=False, size=engine.BOARD_SIZE):
+        if self.board is None:
+            self.board = Board(color1, color2, self, self, difficulty, computer, size)
+            self.central_widget.addWidget(self.board.gameWidget)
+        else:
+            self.board.newGame(color1, color2, difficulty, computer, size)
+        self.central_widget.setCurrentWidget(self.board.gameWidget)
+
+    def openReplay(self, path, index=0):
+        with records.RecordReader(path) as reader:
+            record = reader[index]
+            moves = reader.moves(index)
+        color1, color2 = (Qt.GlobalColor(value) for value in record.colors)
+        self.openGameBoard(color1, color2, record.difficulty, size=record.size)
+        self.board.startReplay(moves)
+
+    def openNetworkGame(self, address=None, game_id=None, difficulty=engine.CLASSIC, size=None):
+        # address - "host:port" сервера server.py; при входе в партию game_id
+        # уровень и размер доски берутся из ответа сервера
+        if address is None:
+            import server
+
+            address = f"127.0.0.1:{server.DEFAULT_PORT}"
+        self.server_address = address
+        host, _, port = address.rpartition(':')
+        self.openGameBoard(*self.selected_colors, difficulty, size=size or self.board_size)
+        self.board.connectRemote(host or '127.0.0.1', int(port), game_id)
 
     def createLevelButton(self, text):
         button = QPushButton()
@@ -651,14 +1241,7 @@ class Game(QMainWindow):
 
         label = QLabel(text)
         label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        label.setStyleSheet("""
-                font-size: 20px; 
-                color: #2c3e50;
-                font-weight: bold;
-                text-transform: uppercase;
-                min-width: 220px; 
-                min-height: 60px;
-        """)
+        label.setObjectName("levelLabel")
 
         button_layout.addWidget(label)
 
@@ -668,25 +1251,46 @@ class Game(QMainWindow):
 
     def setupBackButton(self, layout, callback):
         self.rules_back_button = QPushButton("← Назад")
-        self.rules_back_button.setStyleSheet("""
-                    QPushButton {
-                        font-size: 16px;
-                        border: 2px solid #7f8c8d;
-                        border-radius: 10px;
-                        padding: 10px;
-                        background: #ecf0f1;
-                    }
-                    QLabel {
-                        font-size: 20px;
-                        color: #2c3e50;
-                    }
-                """)
+        self.rules_back_button.setObjectName("backButton")
         layout.addWidget(self.rules_back_button, alignment=Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
         self.rules_back_button.clicked.connect(callback)
 
 
+def optionValue(argv, name, default=None):
+    if name in argv and argv.index(name) + 1 < len(argv):
+        return argv[argv.index(name) + 1]
+    return default
+
+
+def instrumentHandlers(profiler):
+    profiler.instrument(Board, ['showMoves', 'clearMoveIndicators', 'movePiece', 'checkWinCondition',
+                                'checkMediumCondition', 'checkHardCondition', 'paintEvent'])
+    profiler.count(Board, ['getPieceAt'])
+    profiler.track(Piece, 'mousePressEvent', lambda item: item.scene())
+    profiler.track(MoveIndicator, 'mousePressEvent', lambda item: item.board.scene)
+
+
 if __name__ == "__main__":
+    startup = profiling.StartupProfile(STARTED) if '--startup-profile' in sys.argv else None
+    if startup is not None:
+        startup.mark('imports', IMPORTED)
+    if profiling.enable_from_environment(sys.argv) is not None:
+        instrumentHandlers(profiling.profiler)
     app = QApplication(sys.argv)
-    game = Game()
+    if startup is not None:
+        startup.mark('QApplication')
+    game = Game(optionValue(sys.argv, '--record'))
+    if startup is not None:
+        startup.mark('Game()')
     game.show()
+    if startup is not None:
+        startup.mark('show')
+        # Нулевой таймер срабатывает, когда цикл событий обработал первый кадр
+        QTimer.singleShot(0, lambda: (startup.mark('first frame'), startup.report()))
+    if optionValue(sys.argv, '--replay') is not None:
+        game.openReplay(optionValue(sys.argv, '--replay'), int(optionValue(sys.argv, '--replay-game', 0)))
+    if optionValue(sys.argv, '--connect') is not None:
+        join = optionValue(sys.argv, '--join')
+        game.openNetworkGame(optionValue(sys.argv, '--connect'), None if join is None else int(join),
+                             optionValue(sys.argv, '--difficulty', engine.CLASSIC))
     app.exec()
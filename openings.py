@@ -0,0 +1,195 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+
+import engine
+import records
+
+# Дебютная книга: для ключа позиции (Position.key) - сыгранные ходы с числом
+# партий, побед и ничьих ходившего игрока. Книга строится из файлов записей
+# партий (records.py), записи отсортированы по (ключ, ход), поэтому ход
+# находится двоичным поиском прямо по отображённому в память файлу.
+
+MAGIC = b'UGBK\x01'
+HEADER = struct.Struct('<5sBBI')
+ENTRY = struct.Struct('<QHHIII')
+BOOK_DIR = os.path.dirname(os.path.abspath(__file__))
+BOOK_PLIES = 20
+MIN_WEIGHT = 4
+
+_loaded = {}
+
+
+def book_path(difficulty, size=engine.BOARD_SIZE, directory=BOOK_DIR):
+    return os.path.join(directory, f'book_{difficulty}_{size}.ubk')
+
+
+def collect(paths, difficulty, size=engine.BOARD_SIZE, plies=BOOK_PLIES, entries=None):
+    # {(ключ, from, to): [партий, побед, ничьих]} по первым plies полуходам
+    entries = {} if entries is None else entries
+    for path in paths:
+        with records.RecordReader(path) as reader:
+            for record in reader:
+                if record.difficulty != difficulty or record.size != size or record.result == records.UNFINISHED:
+                    continue
+                position = engine.Position(difficulty, size)
+                key = position.key
+                side = position.side
+                for move in records.decode_moves(position, record.data):
+                    if move is not None:
+                        stats = entries.setdefault((key, move[0], move[1]), [0, 0, 0])
+                        stats[0] += 1
+                        stats[1] += record.result == side
+                        stats[2] += record.result == records.DRAW
+                    if position.ply >= plies:
+                        break
+                    key = position.key
+                    side = position.side
+    return entries
+
+
+def write(path, difficulty, size, entries):
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, engine.DIFFICULTIES.index(difficulty), size, len(entries)))
+        for (key, frm, to), (weight, wins, draws) in sorted(entries.items()):
+            file.write(ENTRY.pack(key, frm, to, weight, wins, draws))
+
+
+def prune(entries, max_bytes=None, min_weight=1):
+    # Сначала выбрасываются редкие ходы, пока книга не влезет в max_bytes
+    kept = {move: stats for move, stats in entries.items() if stats[0] >= min_weight}
+    if max_bytes is not None:
+        limit = max(0, (max_bytes - HEADER.size) // ENTRY.size)
+        if len(kept) > limit:
+            ranked = sorted(kept.items(), key=lambda item: -item[1][0])[:limit]
+            kept = dict(ranked)
+    return kept
+
+
+class Book:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, layout, self.size, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or len(self.data) != HEADER.size + self.count * ENTRY.size:
+            self.close()
+            raise ValueError(f"{path}: не дебютная книга")
+        self.difficulty = engine.DIFFICULTIES[layout]
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, index):
+        return ENTRY.unpack_from(self.data, HEADER.size + index * ENTRY.size)
+
+    def entries(self):
+        # {(ключ, from, to): [партий, побед, ничьих]} для слияния и обрезки
+        result = {}
+        for index in range(self.count):
+            key, frm, to, weight, wins, draws = self.entry(index)
+            result[key, frm, to] = [weight, wins, draws]
+        return result
+
+    def lookup(self, key):
+        # Двоичный поиск первой записи с ключом key
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        while low < self.count:
+            entry_key, frm, to, weight, wins, draws = self.entry(low)
+            if entry_key != key:
+                break
+            found.append(((frm, to), weight, wins, draws))
+            low += 1
+        return found
+
+    def choose(self, position, min_weight=MIN_WEIGHT):
+        # Ход с лучшим сглаженным результатом среди достаточно сыгранных
+        if position.variant.difficulty != self.difficulty or position.size != self.size:
+            return None
+        best = None
+        best_score = None
+        for move, weight, wins, draws in self.lookup(position.key):
+            if weight < min_weight or not position.is_legal(move):
+                continue
+            score = (wins + draws / 2 + 1) / (weight + 2)
+            if best is None or (score, weight) > best_score:
+                best, best_score = move, (score, weight)
+        return best
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def load(difficulty, size=engine.BOARD_SIZE):
+    # Книга из BOOK_DIR или None; результат запоминается
+    key = (difficulty, size)
+    if key not in _loaded:
+        try:
+            _loaded[key] = Book(book_path(difficulty, size))
+        except (OSError, ValueError):
+            _loaded[key] = None
+    return _loaded[key]
+
+
+def read_entries(paths, difficulty=None, size=None):
+    entries = {}
+    for path in paths:
+        book = Book(path)
+        if difficulty is not None and (book.difficulty, book.size) != (difficulty, size):
+            book.close()
+            raise ValueError(f"{path}: книга для другой расстановки")
+        difficulty, size = book.difficulty, book.size
+        for move, stats in book.entries().items():
+            total = entries.setdefault(move, [0, 0, 0])
+            for i in range(3):
+                total[i] += stats[i]
+        book.close()
+    return entries, difficulty, size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Дебютная книга из записей партий")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="построить книгу из файлов записей")
+    build.add_argument('records', nargs='+')
+    build.add_argument('-d', '--difficulty', choices=engine.DIFFICULTIES, default=engine.CLASSIC)
+    build.add_argument('--size', type=int, default=engine.BOARD_SIZE)
+    build.add_argument('--plies', type=int, default=BOOK_PLIES)
+    merge = commands.add_parser('merge', help="слить несколько книг")
+    merge.add_argument('books', nargs='+')
+    trim = commands.add_parser('prune', help="обрезать книгу")
+    trim.add_argument('books', nargs=1)
+    show = commands.add_parser('show', help="ходы книги в стартовой позиции")
+    show.add_argument('book')
+    for command in (build, merge, trim):
+        command.add_argument('-o', '--output', default=None)
+        command.add_argument('--max-bytes', type=int, default=None)
+        command.add_argument('--min-weight', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        book = Book(args.book)
+        position = engine.Position(book.difficulty, book.size)
+        print(f"{book.difficulty} {book.size}x{book.size}: {len(book)} entries, choice {book.choose(position)}")
+        for move, weight, wins, draws in sorted(book.lookup(position.key), key=lambda item: -item[1]):
+            print(f"  {move}  games {weight}  wins {wins}  draws {draws}")
+        book.close()
+        sys.exit(0)
+    if args.command == 'build':
+        difficulty, size = args.difficulty, args.size
+        entries = collect(args.records, difficulty, size, args.plies)
+    else:
+        entries, difficulty, size = read_entries(args.books)
+    entries = prune(entries, args.max_bytes, args.min_weight)
+    output = args.output or book_path(difficulty, size)
+    write(output, difficulty, size, entries)
+    print(f"{output}: {len(entries)} entries, {HEADER.size + len(entries) * ENTRY.size} bytes")
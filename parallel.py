@@ -0,0 +1,150 @@
+import argparse
+import multiprocessing
+import os
+import time
+
+import engine
+import search
+
+# Параллельный поиск разделением корня: первый ход каждой итерации
+# считается с полным окном, остальные ходы раздаются процессам пула с
+# нулевым окном и пересчитываются, если оказались лучше.
+# Процессы получают только компактное состояние Position.state() и
+# историю для правил ничьей Position.tracking().
+
+_searcher = None
+
+
+def _worker_searcher():
+    global _searcher
+    if _searcher is None:
+        _searcher = search.Searcher()
+    return _searcher
+
+
+def _score_move(job):
+    state, tracking, move, depth, alpha, beta, wall_deadline = job
+    position = engine.Position.from_state(state, tracking)
+    position.make(move)
+    searcher = _worker_searcher()
+    # Срок передаётся по настенным часам: perf_counter у процессов свой
+    deadline = None if wall_deadline is None else time.perf_counter() + wall_deadline - time.time()
+    try:
+        score = -searcher.score(position, depth - 1, -beta, -alpha, deadline)
+    except search.SearchTimeout:
+        score = None
+    return move, score, searcher.nodes
+
+
+class ParallelSearcher:
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def search(self, position, time_limit=None, max_depth=64, on_depth=None):
+        self.start()
+        started = time.perf_counter()
+        deadline = None if time_limit is None else time.time() + time_limit
+        state = position.state()
+        tracking = position.tracking()
+        moves = position.moves()
+        if not moves:
+            return search.SearchResult(None, 0, 0, 0, 0.0)
+        result = search.SearchResult(moves[0], 0, 0, 0, 0.0)
+        nodes = 0
+
+        for depth in range(1, max_depth + 1):
+            scores = {}
+            move, alpha, used = self.pool.apply(
+                _score_move, ((state, tracking, moves[0], depth, -search.INFINITY, search.INFINITY, deadline),))
+            nodes += used
+            if alpha is None:
+                break
+            scores[move] = alpha
+            best_move = move
+
+            jobs = [(state, tracking, move, depth, alpha, alpha + 1, deadline) for move in moves[1:]]
+            better = []
+            timed_out = False
+            for move, score, used in self.pool.imap_unordered(_score_move, jobs):
+                nodes += used
+                if score is None:
+                    timed_out = True
+                elif score > alpha:
+                    better.append(move)
+                else:
+                    scores[move] = score
+            if better and not timed_out:
+                jobs = [(state, tracking, move, depth, alpha, search.INFINITY, deadline) for move in better]
+                for move, score, used in self.pool.imap_unordered(_score_move, jobs):
+                    nodes += used
+                    if score is None:
+                        timed_out = True
+                    else:
+                        scores[move] = score
+                        if score > alpha:
+                            alpha = score
+                            best_move = move
+            if timed_out:
+                break
+
+            result = search.SearchResult(best_move, alpha, depth, nodes, time.perf_counter() - started)
+            if on_depth is not None:
+                on_depth(result)
+            if abs(alpha) >= search.MATE_BOUND:
+                break
+            moves.sort(key=lambda move: -scores.get(move, -search.INFINITY))
+
+        result.nodes = nodes
+        result.elapsed = time.perf_counter() - started
+        return result
+
+
+def speedup_curve(workers=(1, 2, 4, 8), depth=6, difficulties=engine.DIFFICULTIES):
+    # Ускорение считается относительно обычного search.Searcher в этом
+    # процессе, чтобы в кривую вошли и расходы на пул
+    rows = []
+    for difficulty in difficulties:
+        position = engine.Position(difficulty)
+        result = search.Searcher(book=False).search(position, max_depth=depth)
+        baseline = result.elapsed
+        rows.append((difficulty, 'serial', result.elapsed, 1.0, result.nodes, result.move))
+        for count in workers:
+            with ParallelSearcher(count) as searcher:
+                result = searcher.search(position, max_depth=depth)
+            rows.append((difficulty, count, result.elapsed, baseline / result.elapsed, result.nodes, result.move))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Кривая ускорения параллельного поиска")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('difficulties', nargs='*', default=list(engine.DIFFICULTIES))
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    print(f"cpu_count={cpus} depth={args.depth}")
+    if max(args.workers) > cpus:
+        print(f"процессов больше, чем ядер ({cpus}): ускорение для них не показательно")
+    print(f"{'layout':8} {'workers':>7} {'seconds':>8} {'speedup':>8} {'nodes':>9}  move")
+    for difficulty, count, elapsed, speedup, nodes, move in speedup_curve(args.workers, args.depth,
+                                                                           args.difficulties):
+        print(f"{difficulty:8} {count:>7} {elapsed:8.2f} {speedup:8.2f} {nodes:9d}  {move}")
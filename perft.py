@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import engine
+
+# Контроль правил и их скорости: число листьев дерева ходов до глубины N
+# из стартовых расстановок должно совпадать с эталоном, а скорость
+# генерации ходов, make/unmake и проверки победы не должна падать
+# относительно сохранённой базы больше чем на порог.
+
+GOLDEN = {
+    engine.CLASSIC: [1, 12, 144, 2784, 53824, 1135552],
+    engine.MEDIUM: [1, 14, 196, 4412, 99540, 2553805],
+    engine.HARD: [1, 18, 324, 7416, 169744, 4493636],
+}
+BASELINE_FILE = 'perft_baseline.json'
+THRESHOLD = 0.2
+
+
+def perft(position, depth):
+    if depth == 0 or position.winner() is not None:
+        return 1
+    moves = position.moves()
+    if not moves:
+        position.make_pass()
+        nodes = perft(position, depth - 1)
+        position.unmake()
+        return nodes
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        position.make(move)
+        nodes += perft(position, depth - 1)
+        position.unmake()
+    return nodes
+
+
+def sample_positions(difficulty, count=200, seed=0, size=engine.BOARD_SIZE):
+    # Позиции из случайных партий: середина игры, а не только старт
+    rng = random.Random(seed)
+    positions = []
+    position = engine.Position(difficulty, size)
+    while len(positions) < count:
+        moves = position.moves()
+        if not moves or position.winner() is not None or position.is_draw():
+            position = engine.Position(difficulty, size)
+            continue
+        position.make(rng.choice(moves))
+        positions.append(position.copy())
+    return positions
+
+
+def timed(function, min_time=0.3):
+    # Повторяет function, пока не наберётся min_time; возвращает операций в секунду
+    operations = 0
+    started = time.perf_counter()
+    while True:
+        operations += function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            return operations / elapsed
+
+
+def throughput(difficulty, depth):
+    positions = sample_positions(difficulty)
+    move_lists = [position.moves() for position in positions]
+
+    def generate():
+        return sum(len(position.moves()) for position in positions)
+
+    def make_unmake():
+        operations = 0
+        for position, moves in zip(positions, move_lists):
+            for move in moves:
+                position.make(move)
+                position.unmake()
+            operations += len(moves)
+        return operations
+
+    def win_checks():
+        for position in positions:
+            for rule in engine.DIFFICULTIES:
+                position.winner(rule)
+        return len(positions) * len(engine.DIFFICULTIES)
+
+    def tree():
+        return perft(engine.Position(difficulty), depth)
+
+    return {
+        'movegen_moves_per_s': timed(generate),
+        'make_unmake_per_s': timed(make_unmake),
+        'win_checks_per_s': timed(win_checks),
+        'perft_nodes_per_s': timed(tree),
+    }
+
+
+def scaling(difficulty, sizes=engine.BOARD_SIZES):
+    # Генерация ходов в пересчёте на фишку для разных размеров доски
+    rates = {}
+    for size in sizes:
+        positions = sample_positions(difficulty, size=size)
+        pieces = sum(position.masks[position.side].bit_count() for position in positions)
+
+        def generate():
+            for position in positions:
+                position.moves()
+            return pieces
+
+        rates[size] = timed(generate)
+        print(f"{difficulty:8} {size:2d}x{size:<2d} {rates[size]:12.0f} pieces/s  "
+              f"x{rates[sizes[0]] / rates[size]:.2f} slower than {sizes[0]}x{sizes[0]}")
+    return rates
+
+
+def run(depth, difficulties, baseline=None, threshold=THRESHOLD):
+    failures = []
+    report = {}
+    for difficulty in difficulties:
+        started = time.perf_counter()
+        nodes = perft(engine.Position(difficulty), depth)
+        elapsed = time.perf_counter() - started
+        golden = GOLDEN[difficulty][depth] if depth < len(GOLDEN[difficulty]) else None
+        status = 'ok' if golden is None or nodes == golden else f'MISMATCH (golden {golden})'
+        if golden is not None and nodes != golden:
+            failures.append(f"{difficulty}: perft({depth}) = {nodes}, ожидалось {golden}")
+        print(f"{difficulty:8} perft({depth}) = {nodes:9d}  {elapsed:6.2f} s  {status}")
+
+        rates = throughput(difficulty, min(depth, 3))
+        report[difficulty] = rates
+        for name, rate in rates.items():
+            line = f"{'':8} {name:22} {rate:12.0f}"
+            reference = (baseline or {}).get(difficulty, {}).get(name)
+            if reference:
+                change = rate / reference - 1
+                line += f"  {change:+.1%} vs baseline"
+                if change < -threshold:
+                    failures.append(f"{difficulty}: {name} упал на {-change:.1%}")
+            print(line)
+    return report, failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Perft и замеры скорости правил")
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="JSON со скоростями для сравнения")
+    parser.add_argument('--save-baseline', action='store_true', help="записать текущие скорости как базу")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="допустимое падение скорости (доля)")
+    parser.add_argument('--sizes', type=int, nargs='+', help="только замер генерации ходов на этих размерах")
+    parser.add_argument('difficulties', nargs='*', default=list(engine.DIFFICULTIES))
+    args = parser.parse_args()
+
+    if args.sizes:
+        for difficulty in args.difficulties:
+            scaling(difficulty, args.sizes)
+        sys.exit(0)
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    report, failures = run(args.depth, args.difficulties, baseline, args.threshold)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"База сохранена в {args.baseline}")
+    if failures:
+        print('\n'.join(failures), file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,155 @@
+import atexit
+import collections
+import csv
+import functools
+import json
+import os
+import sys
+import time
+
+# Замеры горячих обработчиков интерфейса. Включаются переменной окружения
+# UGOLKI_PROFILE (путь к .json или .csv, либо 1) или ключом --profile.
+# Без них методы классов не оборачиваются, и накладных расходов нет.
+# Время записывается в миллисекундах, перцентили считаются по окну WINDOW.
+# StartupProfile - разбивка холодного старта по этапам (--startup-profile).
+
+ENV_VAR = 'UGOLKI_PROFILE'
+OVERLAY_ENV_VAR = 'UGOLKI_PROFILE_OVERLAY'
+DEFAULT_OUTPUT = 'profile.json'
+WINDOW = 2000
+PERCENTILES = (50, 90, 99)
+
+profiler = None
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Profiler:
+    def __init__(self, output=DEFAULT_OUTPUT, overlay=False):
+        self.output = output
+        self.overlay = overlay
+        # Скользящее окно последних значений для каждой метрики
+        self.samples = collections.defaultdict(lambda: collections.deque(maxlen=WINDOW))
+        self.totals = collections.Counter()
+        self.counters = collections.Counter()
+
+    def record(self, name, value):
+        self.samples[name].append(value)
+        self.totals[name] += 1
+
+    def timed(self, name, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, (time.perf_counter() - started) * 1000)
+        return wrapper
+
+    def counted(self, name, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            self.counters[name] += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    def interaction(self, name, function, scene_of):
+        # Клик целиком: время, число вызовов счётчиков и элементов сцены
+        @functools.wraps(function)
+        def wrapper(item, *args, **kwargs):
+            self.counters.clear()
+            started = time.perf_counter()
+            try:
+                return function(item, *args, **kwargs)
+            finally:
+                self.record(name, (time.perf_counter() - started) * 1000)
+                for counter, value in self.counters.items():
+                    self.record(f"{name}.{counter}", value)
+                scene = scene_of(item)
+                if scene is not None:
+                    self.record(f"{name}.scene_items", len(scene.items()))
+        return wrapper
+
+    def instrument(self, cls, names, prefix=None):
+        for name in names:
+            setattr(cls, name, self.timed(f"{prefix or cls.__name__}.{name}", getattr(cls, name)))
+
+    def count(self, cls, names):
+        for name in names:
+            setattr(cls, name, self.counted(name, getattr(cls, name)))
+
+    def track(self, cls, name, scene_of):
+        setattr(cls, name, self.interaction(f"{cls.__name__}.{name}", getattr(cls, name), scene_of))
+
+    def summary(self):
+        result = {}
+        for name, values in sorted(self.samples.items()):
+            if not values:
+                continue
+            stats = {'count': self.totals[name], 'window': len(values), 'max': max(values)}
+            for percent in PERCENTILES:
+                stats[f'p{percent}'] = percentile(values, percent)
+            result[name] = stats
+        return result
+
+    def overlay_text(self):
+        lines = []
+        for name, stats in self.summary().items():
+            lines.append(f"{name}: p50 {stats['p50']:.2f} p99 {stats['p99']:.2f}")
+        return '\n'.join(lines)
+
+    def dump(self, path=None):
+        path = path or self.output
+        summary = self.summary()
+        if path.endswith('.csv'):
+            fields = ['name', 'count', 'window', 'max'] + [f'p{percent}' for percent in PERCENTILES]
+            with open(path, 'w', newline='') as file:
+                writer = csv.DictWriter(file, fields)
+                writer.writeheader()
+                for name, stats in summary.items():
+                    writer.writerow(dict(stats, name=name))
+        else:
+            with open(path, 'w') as file:
+                json.dump(summary, file, indent=2)
+
+
+class StartupProfile:
+    def __init__(self, started=None):
+        self.started = time.perf_counter() if started is None else started
+        self.last = self.started
+        self.stages = []
+
+    def mark(self, name, now=None):
+        # Этап длится от предыдущей отметки до текущей
+        now = time.perf_counter() if now is None else now
+        self.stages.append((name, (now - self.last) * 1000))
+        self.last = now
+
+    def report(self, file=None):
+        lines = [f"{name:16} {elapsed:8.1f} ms" for name, elapsed in self.stages]
+        lines.append(f"{'total':16} {(self.last - self.started) * 1000:8.1f} ms")
+        print('\n'.join(lines), file=file or sys.stderr)
+
+
+def enable(output=DEFAULT_OUTPUT, overlay=False):
+    global profiler
+    if profiler is None:
+        profiler = Profiler(output, overlay)
+        atexit.register(profiler.dump)
+    return profiler
+
+
+def enable_from_environment(argv):
+    value = os.environ.get(ENV_VAR)
+    if ('--profile' in argv or '--profile-overlay' in argv) and not value:
+        value = DEFAULT_OUTPUT
+    if not value:
+        return None
+    output = DEFAULT_OUTPUT if value == '1' else value
+    overlay = '--profile-overlay' in argv or os.environ.get(OVERLAY_ENV_VAR) == '1'
+    return enable(output, overlay)
@@ -0,0 +1,198 @@
+import argparse
+import array
+import collections
+import mmap
+import os
+import struct
+
+import engine
+
+# Компактная запись партий. Файл начинается с сигнатуры MAGIC, дальше
+# партии идут подряд: заголовок GAME (метка, расстановка, размер доски,
+# цвета, результат, число полуходов, длина ходов в байтах) и ходы.
+# Ход хранится номером в списке Position.moves() в формате varint
+# (1 байт до 128 ходов, 2 байта до 16384), пропуск хода - номером
+# len(moves). Порядок Position.moves() поэтому входит в формат: при его
+# изменении нужно поднять версию в MAGIC.
+
+MAGIC = b'UGLR\x01'
+GAME = struct.Struct('<BBBBBBII')
+GAME_MARK = 0xA5
+DRAW = 2
+UNFINISHED = 3
+# Qt.GlobalColor.black и Qt.GlobalColor.white: цвета партий без интерфейса
+DEFAULT_COLORS = (2, 3)
+
+Record = collections.namedtuple('Record', 'difficulty size colors result plies data')
+
+
+def result_of(winner, finished=True):
+    # Победитель 0/1, ничья или незаконченная партия
+    if winner is not None:
+        return winner
+    return DRAW if finished else UNFINISHED
+
+
+def encode_moves(difficulty, size, history):
+    position = engine.Position(difficulty, size)
+    data = bytearray()
+    for move in history:
+        moves = position.moves()
+        if move is None:
+            index = len(moves)
+            position.make_pass()
+        else:
+            index = moves.index(move)
+            position.make(move)
+        while index >= 0x80:
+            data.append(index & 0x7F | 0x80)
+            index >>= 7
+        data.append(index)
+    return bytes(data)
+
+
+def decode_moves(position, data):
+    # Проигрывает ходы на position и отдаёт каждый ход после его выполнения
+    offset = 0
+    while offset < len(data):
+        index = shift = 0
+        while True:
+            byte = data[offset]
+            offset += 1
+            index |= (byte & 0x7F) << shift
+            shift += 7
+            if byte < 0x80:
+                break
+        moves = position.moves()
+        if index == len(moves):
+            position.make_pass()
+            yield None
+        elif index < len(moves):
+            position.make(moves[index])
+            yield moves[index]
+        else:
+            raise ValueError(f"Ход {index} вне списка из {len(moves)} ходов на полуходе {position.ply}")
+
+
+def encode_game(position, colors=DEFAULT_COLORS, result=UNFINISHED):
+    variant = position.variant
+    data = encode_moves(variant.difficulty, variant.size, position.history)
+    header = GAME.pack(GAME_MARK, engine.DIFFICULTIES.index(variant.difficulty), variant.size,
+                       colors[0], colors[1], result, len(position.history), len(data))
+    return header + data
+
+
+class RecordWriter:
+    def __init__(self, path):
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+
+    def write(self, position, colors=DEFAULT_COLORS, result=UNFINISHED):
+        self.file.write(encode_game(position, colors, result))
+
+    def append(self, encoded):
+        # Партия, уже закодированная encode_game (например, в другом процессе)
+        self.file.write(encoded)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def append_game(path, position, colors=DEFAULT_COLORS, result=UNFINISHED):
+    with RecordWriter(path) as writer:
+        writer.write(position, colors, result)
+
+
+class RecordReader:
+    # Файл отображается в память; в памяти держится только массив смещений партий
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path}: не файл записей партий")
+        self.offsets = array.array('Q')
+        self.index()
+
+    def index(self):
+        offset = len(MAGIC)
+        while offset + GAME.size <= len(self.data):
+            mark, *_, length = GAME.unpack_from(self.data, offset)
+            if mark != GAME_MARK:
+                raise ValueError(f"Повреждённая запись по смещению {offset}")
+            if offset + GAME.size + length > len(self.data):
+                # Недописанная последняя партия
+                break
+            self.offsets.append(offset)
+            offset += GAME.size + length
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        offset = self.offsets[index]
+        _, layout, size, color1, color2, result, plies, length = GAME.unpack_from(self.data, offset)
+        start = offset + GAME.size
+        return Record(engine.DIFFICULTIES[layout], size, (color1, color2), result, plies,
+                      self.data[start:start + length])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def moves(self, index):
+        record = self[index]
+        return list(decode_moves(engine.Position(record.difficulty, record.size), record.data))
+
+    def positions(self, index):
+        # Одна и та же позиция после каждого полухода, без копий
+        record = self[index]
+        position = engine.Position(record.difficulty, record.size)
+        yield position
+        for _ in decode_moves(position, record.data):
+            yield position
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Просмотр файла записей партий")
+    parser.add_argument('path')
+    parser.add_argument('-g', '--game', type=int, help="номер партии для вывода")
+    args = parser.parse_args()
+
+    with RecordReader(args.path) as reader:
+        if args.game is None:
+            plies = moves_bytes = 0
+            results = collections.Counter()
+            for record in reader:
+                plies += record.plies
+                moves_bytes += len(record.data)
+                results[record.result] += 1
+            print(f"{len(reader)} games, {plies} plies, {moves_bytes / max(plies, 1):.2f} bytes/move")
+            print(f"wins color1 {results[0]}, color2 {results[1]}, draws {results[DRAW]}, "
+                  f"unfinished {results[UNFINISHED]}")
+        else:
+            record = reader[args.game]
+            print(f"{record.difficulty} {record.size}x{record.size}, result {record.result}, {record.plies} plies")
+            position = None
+            for position in reader.positions(args.game):
+                pass
+            print(position)
@@ -0,0 +1,325 @@
+import time
+
+import engine
+import openings
+import tablebase
+
+INFINITY = 1_000_000
+MATE = 100_000
+MATE_BOUND = MATE - 1000
+EXACT, LOWER, UPPER = 0, 1, 2
+# Бюджет компьютерного соперника (секунды на ход) для каждого уровня
+TIME_BUDGETS = {engine.CLASSIC: 0.3, engine.MEDIUM: 0.6, engine.HARD: 1.0}
+NODE_CHECK = 1023
+# Вес разницы ходов гонки по таблице окончаний в оценке, когда её исход
+# не доказан
+RACE_WEIGHT = 2
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchResult:
+    def __init__(self, move, score, depth, nodes, elapsed):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return f"SearchResult(move={self.move}, score={self.score}, depth={self.depth}, nodes={self.nodes})"
+
+
+class TranspositionTable:
+    # Таблица фиксированного размера: слот выбирается по младшим битам ключа.
+    # Запись заменяется, если она из прошлого поиска или считалась на меньшую глубину.
+    def __init__(self, bits=18):
+        self.mask = (1 << bits) - 1
+        self.slots = [None] * (1 << bits)
+        self.generation = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def clear(self):
+        self.slots = [None] * len(self.slots)
+
+    def probe(self, key):
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        index = key & self.mask
+        entry = self.slots[index]
+        if (entry is None or entry[0] == key or entry[5] != self.generation
+                or depth >= entry[1]):
+            self.slots[index] = (key, depth, score, flag, move, self.generation)
+
+
+class Searcher:
+    def __init__(self, tt_bits=18, tt=None, book=True, rules=None):
+        self.tt = tt or TranspositionTable(tt_bits)
+        self.rules = rules or engine.DEFAULT_RULES
+        # Сначала ход из дебютной книги, если она есть и позиция в ней найдена
+        self.book = book
+        self.killers = []
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def prepare(self, position, deadline, max_depth, node_limit=None):
+        variant = position.variant
+        self.dist = variant.distance
+        # Пределы правил ничьей; отключённое правило - бесконечный предел
+        rules = self.rules
+        self.no_progress = engine.no_progress_plies(rules, variant.size) if rules.no_progress else INFINITY
+        self.max_plies = INFINITY if rules.max_plies is None else rules.max_plies
+        # Таблица окончаний, если она построена для этого уровня
+        self.tablebase = tablebase.load(variant.difficulty, variant.size)
+        self.deadline = deadline
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.killers = [[None, None] for _ in range(max_depth + 2)]
+
+    def score(self, position, depth, alpha=-INFINITY, beta=INFINITY, deadline=None):
+        # Оценка позиции поиском фиксированной глубины в окне (alpha, beta);
+        # при нехватке времени бросает SearchTimeout
+        position = position.copy()
+        self.prepare(position, deadline, depth)
+        return self.negamax(position, depth, alpha, beta, 0)
+
+    def search(self, position, time_limit=None, max_depth=64, node_limit=None, on_depth=None):
+        position = position.copy()
+        self.prepare(position, None if time_limit is None else time.perf_counter() + time_limit,
+                     max_depth, node_limit)
+        self.tt.new_search()
+        started = time.perf_counter()
+
+        moves = position.moves()
+        if not moves:
+            return SearchResult(None, 0, 0, 0, 0.0)
+        book = openings.load(position.variant.difficulty, position.size) if self.book else None
+        move = book.choose(position) if book is not None else None
+        if move is not None:
+            return SearchResult(move, 0, 0, 0, time.perf_counter() - started)
+        result = SearchResult(moves[0], 0, 0, 0, 0.0)
+        for depth in range(1, max_depth + 1):
+            try:
+                score, move = self.root(position, depth)
+            except SearchTimeout:
+                break
+            result = SearchResult(move, score, depth, self.nodes, time.perf_counter() - started)
+            if on_depth is not None:
+                on_depth(result)
+            if abs(score) >= MATE_BOUND:
+                break
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    def rank(self, position, depth, deadline=None):
+        # Точная оценка каждого хода (полное окно, без отсечений между ходами)
+        # для режима анализа: список (оценка, ход) от лучшего к худшему
+        position = position.copy()
+        self.prepare(position, deadline, depth)
+        self.tt.new_search()
+        entry = self.tt.probe(position.key)
+        ranking = []
+        for move in self.ordered(position, position.moves(), entry[4] if entry else None):
+            position.make(move)
+            ranking.append((-self.negamax(position, depth - 1, -INFINITY, INFINITY, 1), move))
+            position.unmake()
+        ranking.sort(key=lambda item: -item[0])
+        if ranking:
+            self.tt.store(position.key, depth, ranking[0][0], EXACT, ranking[0][1])
+        return ranking
+
+    def check_limits(self):
+        if self.stopped:
+            raise SearchTimeout
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchTimeout
+
+    def ordered(self, position, moves, first, ply=0):
+        # Сначала ход из таблицы, затем killer-ходы, затем по продвижению к цели
+        dist = self.dist[position.side]
+        moves.sort(key=lambda move: dist[move[1]] - dist[move[0]])
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        for move in reversed(killers):
+            if move is not None and move != first and move in moves:
+                moves.remove(move)
+                moves.insert(0, move)
+        if first is not None and first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+    def add_killer(self, move, ply):
+        if ply < len(self.killers):
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+
+    def root(self, position, depth):
+        entry = self.tt.probe(position.key)
+        moves = self.ordered(position, position.moves(), entry[4] if entry else None)
+        alpha, beta = -INFINITY, INFINITY
+        best_move = moves[0]
+        for move in moves:
+            position.make(move)
+            if move is moves[0]:
+                score = -self.negamax(position, depth - 1, -beta, -alpha, 1)
+            else:
+                score = -self.negamax(position, depth - 1, -alpha - 1, -alpha, 1)
+                if score > alpha:
+                    score = -self.negamax(position, depth - 1, -beta, -alpha, 1)
+            position.unmake()
+            if score > alpha:
+                alpha = score
+                best_move = move
+        self.tt.store(position.key, depth, alpha, EXACT, best_move)
+        return alpha, best_move
+
+    def negamax(self, position, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & NODE_CHECK:
+            self.check_limits()
+
+        variant = position.variant
+        side = position.side
+        if position.in_home[1 - side] >= variant.win_count:
+            return -(MATE - ply)
+        key = position.key
+        # Повтор внутри дерева или истории партии - ничья, как и при
+        # троекратном повторе: выиграть больше, чем при первом повторе, нельзя
+        ply_count = position.ply
+        if (position.seen[key] > 1 or ply_count - position.advances[-1] >= self.no_progress
+                or ply_count >= self.max_plies):
+            return 0
+        race = self.tablebase.race(position) if self.tablebase is not None else None
+        if race is not None:
+            result = self.tablebase.probe(position, race)
+            if result is not None:
+                # Исход гонки доказан
+                winner, plies = result
+                if ply_count + plies > self.max_plies:
+                    return 0
+                return MATE - ply - plies if winner == side else -(MATE - ply - plies)
+            if depth <= 0:
+                # Расстояния не доказаны или фишки сторон ещё мешают друг
+                # другу: разница ходов гонки - только оценка
+                own, other = race
+                return position.evaluate() + RACE_WEIGHT * (other - own)
+        if depth <= 0:
+            return position.evaluate()
+
+        entry = self.tt.probe(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                score = entry[2]
+                if score >= MATE_BOUND:
+                    score -= ply
+                elif score <= -MATE_BOUND:
+                    score += ply
+                flag = entry[3]
+                if flag == EXACT:
+                    return score
+                if flag == LOWER and score >= beta:
+                    return score
+                if flag == UPPER and score <= alpha:
+                    return score
+
+        moves = position.moves()
+        if not moves:
+            position.make_pass()
+            score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake()
+            return score
+
+        if (depth == 1 and ply_count + 1 - position.advances[-1] < self.no_progress
+                and ply_count + 1 < self.max_plies):
+            # Дочерние узлы - листья: оценка после хода известна без make/unmake;
+            # ничьей в листе может быть только повтор позиции
+            dist = self.dist[side]
+            target = variant.target[side]
+            need = variant.win_count - position.in_home[side]
+            seen = position.seen
+            zobrist = variant.geometry.zobrist[side]
+            key ^= variant.geometry.zobrist_side
+            best = -INFINITY
+            repeated = False
+            for frm, to in moves:
+                if (target >> to & 1) - (target >> frm & 1) >= need:
+                    return MATE - ply - 1
+                if (key ^ zobrist[frm] ^ zobrist[to]) in seen:
+                    repeated = True
+                    continue
+                gain = dist[frm] - dist[to]
+                if gain > best:
+                    best = gain
+            self.nodes += len(moves)
+            if best == -INFINITY:
+                return 0
+            score = position.evaluate() + best
+            return max(score, 0) if repeated else score
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        for move in self.ordered(position, moves, tt_move, ply):
+            position.make(move)
+            if best_move is None:
+                score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # Поиск с нулевым окном, повтор с полным окном при улучшении
+                score = -self.negamax(position, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.add_killer(move, ply)
+                        break
+
+        if best_score >= beta:
+            flag = LOWER
+        elif best_score <= original_alpha:
+            flag = UPPER
+        else:
+            flag = EXACT
+        stored = best_score
+        if stored >= MATE_BOUND:
+            stored += ply
+        elif stored <= -MATE_BOUND:
+            stored -= ply
+        self.tt.store(key, depth, stored, flag, best_move)
+        return best_score
+
+
+def best_move(position, time_limit=None, searcher=None):
+    searcher = searcher or Searcher()
+    if time_limit is None:
+        time_limit = TIME_BUDGETS.get(position.variant.difficulty, 1.0)
+    return searcher.search(position, time_limit=time_limit)
+
+
+if __name__ == '__main__':
+    import sys
+
+    for name in sys.argv[1:] or engine.DIFFICULTIES:
+        result = best_move(engine.Position(name), time_limit=1.0)
+        print(name, result, f"{result.nodes / max(result.elapsed, 1e-9):.0f} nodes/s")
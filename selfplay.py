@@ -0,0 +1,154 @@
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import time
+
+import engine
+import records
+import search
+
+# Самоигра без Qt: партии раздаются процессам пула, результат каждой
+# партии пишется строкой JSON, а ходы - по желанию в файл записей партий.
+
+
+def random_policy(position, rng):
+    moves = position.moves()
+    return rng.choice(moves) if moves else None
+
+
+def greedy_policy(position, rng):
+    # Ход, сильнее всего сокращающий расстояние до цели; равные - случайно
+    dist = position.variant.distance[position.side]
+    best = []
+    best_gain = None
+    for move in position.moves():
+        gain = dist[move[0]] - dist[move[1]]
+        if best_gain is None or gain > best_gain:
+            best, best_gain = [move], gain
+        elif gain == best_gain:
+            best.append(move)
+    return rng.choice(best) if best else None
+
+
+class EnginePolicy:
+    def __init__(self, depth, rules=engine.DEFAULT_RULES):
+        self.depth = depth
+        # Без дебютной книги: самоигра нужна в том числе для её построения
+        self.searcher = search.Searcher(tt_bits=16, book=False, rules=rules)
+
+    def __call__(self, position, rng):
+        return self.searcher.search(position, max_depth=self.depth).move
+
+
+def make_policy(spec, rules=engine.DEFAULT_RULES):
+    if spec == 'random':
+        return random_policy
+    if spec == 'greedy':
+        return greedy_policy
+    if spec.startswith('engine'):
+        _, _, depth = spec.partition(':')
+        return EnginePolicy(int(depth or 2), rules)
+    raise ValueError(f"Неизвестная стратегия: {spec}")
+
+
+def play_game(position, policies, rng, rules=engine.DEFAULT_RULES, opening_random=0):
+    # policies[side] выбирает ход; без ходов игрок пропускает ход, как кнопка "Передать ход"
+    while True:
+        winner = position.winner()
+        if winner is not None:
+            return winner, 'win'
+        reason = position.draw_reason(rules)
+        if reason is not None:
+            return None, reason
+        if position.ply < opening_random:
+            move = random_policy(position, rng)
+        else:
+            move = policies[position.side](position, rng)
+        if move is None:
+            position.make_pass()
+        else:
+            position.make(move)
+
+
+_worker_policies = {}
+
+
+def _run_game(job):
+    index, difficulty, specs, seed, rules, opening_random, record = job
+    for spec in specs:
+        if (spec, rules) not in _worker_policies:
+            _worker_policies[spec, rules] = make_policy(spec, rules)
+    policies = tuple(_worker_policies[spec, rules] for spec in specs)
+    rng = random.Random(seed)
+    position = engine.Position(difficulty)
+    started = time.perf_counter()
+    winner, reason = play_game(position, policies, rng, rules, opening_random)
+    result = {
+        'game': index,
+        'difficulty': difficulty,
+        'policies': list(specs),
+        'seed': seed,
+        'winner': winner,
+        'plies': position.ply,
+        'reason': reason,
+        'seconds': round(time.perf_counter() - started, 6),
+    }
+    if record:
+        # Кодируется в процессе пула, основной процесс только дописывает байты
+        result['record'] = records.encode_game(position, result=records.result_of(winner))
+    return result
+
+
+def run(games, difficulty, specs, workers=None, seed=0, rules=engine.DEFAULT_RULES, opening_random=0,
+        output=sys.stdout, writer=None):
+    jobs = ((index, difficulty, specs, seed + index, rules, opening_random, writer is not None)
+            for index in range(games))
+    started = time.perf_counter()
+    finished = 0
+    with multiprocessing.Pool(workers) as pool:
+        for result in pool.imap_unordered(_run_game, jobs, chunksize=max(1, min(64, games // 64))):
+            record = result.pop('record', None)
+            if record is not None:
+                writer.append(record)
+            output.write(json.dumps(result) + '\n')
+            finished += 1
+    elapsed = time.perf_counter() - started
+    return finished, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Пакетная самоигра уголков без графики")
+    parser.add_argument('-n', '--games', type=int, default=100)
+    parser.add_argument('-d', '--difficulty', choices=engine.DIFFICULTIES, default=engine.CLASSIC)
+    parser.add_argument('--first', default='greedy', help="стратегия color2 (ходит первым): random, greedy, engine:N")
+    parser.add_argument('--second', default='greedy', help="стратегия color1")
+    parser.add_argument('-j', '--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repetitions', type=int, default=engine.DEFAULT_RULES.repetitions,
+                        help="ничья при таком числе повторов позиции, 0 - не проверять")
+    parser.add_argument('--no-progress', type=int, default=engine.DEFAULT_RULES.no_progress,
+                        help="ничья, если столько полуходов никто не продвинулся в зону, 0 - не проверять")
+    parser.add_argument('--max-plies', type=int, default=None, help="предел длины партии в полуходах")
+    parser.add_argument('--opening-random', type=int, default=0, help="число первых полуходов, сыгранных случайно")
+    parser.add_argument('-o', '--output', default='-')
+    parser.add_argument('--record', help="дописывать ходы партий в этот файл записей")
+    args = parser.parse_args()
+
+    rules = engine.DrawRules(args.repetitions, args.no_progress, args.max_plies)
+    for spec in (args.first, args.second):
+        make_policy(spec, rules)
+    # Индекс стратегии совпадает с номером игрока: 0 - color1, 1 - color2
+    specs = (args.second, args.first)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    writer = records.RecordWriter(args.record) if args.record else None
+    try:
+        count, elapsed = run(args.games, args.difficulty, specs, args.workers, args.seed, rules,
+                             args.opening_random, output, writer)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if writer is not None:
+            writer.close()
+    print(f"{count} games in {elapsed:.2f} s, {count / max(elapsed, 1e-9):.1f} games/s", file=sys.stderr)
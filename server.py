@@ -0,0 +1,306 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+
+import engine
+
+# Сетевой сервер партий без Qt: asyncio и протокол строк JSON по TCP.
+# Каждая строка запроса - объект с полем "op", на каждый запрос приходит
+# ответ с полем "ok"; ходы соперника и прочие события приходят строками
+# с полем "event". Клетка - номер y * size + x, как в engine.
+#
+#   {"op": "new", "difficulty": "classic", "size": 8, "side": 1}
+#       новая партия; side - сторона создателя (1 ходит первым),
+#       "both" - обе стороны за одним соединением (игра вдвоём за экраном)
+#   {"op": "join", "game": 7}             свободная сторона партии;
+#       ходы принимаются, только когда в партии обе стороны
+#   {"op": "move", "game": 7, "from": 46, "to": 44}
+#   {"op": "pass", "game": 7}             передать ход
+#   {"op": "state", "game": 7}
+#
+# Правила те же, что у доски в интерфейсе: Position.is_legal, Position.winner
+# и правила ничьей engine.DrawRules. Законченная партия удаляется сразу.
+
+DEFAULT_PORT = 8765
+BOTH = 'both'
+
+
+class Match:
+    # Вся партия на сервере: позиция и соединения игроков по сторонам
+    __slots__ = ('id', 'position', 'players')
+
+    def __init__(self, match_id, difficulty, size):
+        self.id = match_id
+        self.position = engine.Position(difficulty, size)
+        self.players = [None, None]
+
+    def state(self):
+        position = self.position
+        return {
+            'game': self.id,
+            'difficulty': position.variant.difficulty,
+            'size': position.size,
+            'masks': position.masks,
+            'side': position.side,
+            'ply': position.ply,
+        }
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class GameServer:
+    def __init__(self, rules=engine.DEFAULT_RULES):
+        self.rules = rules
+        self.matches = {}
+        self.ids = itertools.count(1)
+        self.moves = 0
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        owned = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    reply = self.dispatch(request, writer, owned)
+                except (ProtocolError, ValueError, KeyError, TypeError) as error:
+                    reply = {'ok': False, 'error': str(error)}
+                writer.write(encode(reply))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            for match_id in owned:
+                self.leave(match_id, writer)
+            writer.close()
+
+    def dispatch(self, request, writer, owned):
+        op = request['op']
+        if op == 'new':
+            return self.new(request, writer, owned)
+        if op == 'join':
+            return self.join(self.match(request), writer, owned)
+        if op == 'move':
+            return self.play(self.match(request), writer, (int(request['from']), int(request['to'])))
+        if op == 'pass':
+            return self.play(self.match(request), writer, None)
+        if op == 'state':
+            return dict(self.match(request).state(), ok=True)
+        raise ProtocolError(f"Неизвестная операция: {op}")
+
+    def match(self, request):
+        match = self.matches.get(request['game'])
+        if match is None:
+            raise ProtocolError(f"Нет партии {request['game']}")
+        return match
+
+    def new(self, request, writer, owned):
+        difficulty = request.get('difficulty', engine.CLASSIC)
+        size = int(request.get('size', engine.BOARD_SIZE))
+        if difficulty not in engine.DIFFICULTIES or size not in engine.BOARD_SIZES:
+            raise ProtocolError(f"Нет расстановки {difficulty} {size}x{size}")
+        side = request.get('side', 1)
+        match = Match(next(self.ids), difficulty, size)
+        if side == BOTH:
+            match.players = [writer, writer]
+        elif side in (0, 1):
+            match.players[side] = writer
+        else:
+            raise ProtocolError(f"Нет стороны {side}")
+        self.matches[match.id] = match
+        owned.add(match.id)
+        return dict(match.state(), ok=True, you=side)
+
+    def join(self, match, writer, owned):
+        if None not in match.players:
+            raise ProtocolError(f"В партии {match.id} нет свободной стороны")
+        side = match.players.index(None)
+        match.players[side] = writer
+        owned.add(match.id)
+        self.notify(match, writer, {'event': 'joined', 'game': match.id, 'side': side})
+        return dict(match.state(), ok=True, you=side)
+
+    def play(self, match, writer, move):
+        position = match.position
+        if match.players[position.side] is not writer:
+            raise ProtocolError("Сейчас ход соперника")
+        if None in match.players:
+            raise ProtocolError("Соперника в партии нет")
+        if move is None:
+            position.make_pass()
+        elif position.is_legal(move):
+            position.make(move)
+        else:
+            raise ProtocolError(f"Недопустимый ход {move}")
+        self.moves += 1
+        winner = position.winner()
+        draw = None if winner is not None else position.draw_reason(self.rules)
+        result = {'game': match.id, 'ply': position.ply, 'winner': winner, 'draw': draw}
+        self.notify(match, writer, dict(result, event='move', move=move))
+        if winner is not None or draw is not None:
+            del self.matches[match.id]
+        return dict(result, ok=True)
+
+    def leave(self, match_id, writer):
+        match = self.matches.get(match_id)
+        if match is None:
+            return
+        match.players = [None if player is writer else player for player in match.players]
+        if match.players == [None, None]:
+            del self.matches[match_id]
+        else:
+            self.notify(match, None, {'event': 'left', 'game': match_id})
+
+    def notify(self, match, sender, event):
+        # Событие второму игроку; за одним соединением обе стороны не оповещаются
+        data = encode(event)
+        for player in set(match.players):
+            if player is not None and player is not sender:
+                player.write(data)
+
+    async def report(self, interval, log=sys.stderr):
+        last = self.moves
+        while True:
+            await asyncio.sleep(interval)
+            if self.moves != last:
+                print(f"{(self.moves - last) / interval:.0f} moves/s, {len(self.matches)} games, "
+                      f"{self.connections} connections", file=log)
+            last = self.moves
+
+
+def encode(message):
+    return (json.dumps(message, separators=(',', ':')) + '\n').encode()
+
+
+async def serve(host='127.0.0.1', port=DEFAULT_PORT, rules=engine.DEFAULT_RULES, interval=None):
+    game_server = GameServer(rules)
+    server = await asyncio.start_server(game_server.handle, host, port, limit=1 << 16)
+    if interval:
+        asyncio.get_running_loop().create_task(game_server.report(interval))
+    return game_server, server
+
+
+class Client:
+    # Клиент протокола для генератора нагрузки: ответ на запрос - первая
+    # строка с полем "ok", события по пути пропускаются
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host, port):
+        return cls(*await asyncio.open_connection(host, port, limit=1 << 16))
+
+    async def request(self, **message):
+        self.writer.write(encode(message))
+        await self.writer.drain()
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise ConnectionError("Сервер закрыл соединение")
+            reply = json.loads(line)
+            if 'ok' in reply:
+                return reply
+
+    def close(self):
+        self.writer.close()
+
+
+async def play_client(host, port, games, difficulty, size, seed, latencies):
+    # Партии со случайными ходами за обе стороны; у клиента своя копия позиции
+    rng = random.Random(seed)
+    client = await Client.connect(host, port)
+    try:
+        for _ in range(games):
+            reply = await client.request(op='new', difficulty=difficulty, size=size, side=BOTH)
+            game = reply['game']
+            position = engine.Position(difficulty, size)
+            while True:
+                moves = position.moves()
+                started = time.perf_counter()
+                if moves:
+                    move = rng.choice(moves)
+                    reply = await client.request(op='move', game=game, **{'from': move[0], 'to': move[1]})
+                    position.make(move)
+                else:
+                    reply = await client.request(op='pass', game=game)
+                    position.make_pass()
+                latencies.append(time.perf_counter() - started)
+                if not reply['ok']:
+                    raise RuntimeError(reply['error'])
+                if reply['winner'] is not None or reply['draw'] is not None:
+                    break
+    finally:
+        client.close()
+
+
+async def load(host, port, clients, games, difficulty, size, seed=0, local=False):
+    # clients соединений по games партий; при local сервер в том же процессе
+    server = None
+    if local:
+        _, server = await serve(host, 0)
+        port = server.sockets[0].getsockname()[1]
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(play_client(host, port, games, difficulty, size, seed + index, latencies)
+                           for index in range(clients)))
+    elapsed = time.perf_counter() - started
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+    return latencies, elapsed
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Сервер сетевых партий и генератор нагрузки")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_command = commands.add_parser('serve', help="запустить сервер")
+    serve_command.add_argument('--repetitions', type=int, default=engine.DEFAULT_RULES.repetitions)
+    serve_command.add_argument('--no-progress', type=int, default=engine.DEFAULT_RULES.no_progress)
+    serve_command.add_argument('--max-plies', type=int, default=None)
+    serve_command.add_argument('--stats', type=float, default=5.0, help="интервал статистики, секунды")
+    load_command = commands.add_parser('load', help="нагрузить сервер случайными партиями")
+    load_command.add_argument('-c', '--clients', type=int, default=100)
+    load_command.add_argument('-n', '--games', type=int, default=5, help="партий на соединение")
+    load_command.add_argument('-d', '--difficulty', choices=engine.DIFFICULTIES, default=engine.CLASSIC)
+    load_command.add_argument('--size', type=int, default=engine.BOARD_SIZE)
+    load_command.add_argument('--seed', type=int, default=0)
+    load_command.add_argument('--local', action='store_true', help="сервер в этом же процессе")
+    for command in (serve_command, load_command):
+        command.add_argument('--host', default='127.0.0.1')
+        command.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        async def main():
+            rules = engine.DrawRules(args.repetitions, args.no_progress, args.max_plies)
+            _, server = await serve(args.host, args.port, rules, args.stats)
+            print(f"listening on {args.host}:{server.sockets[0].getsockname()[1]}", file=sys.stderr)
+            await server.serve_forever()
+
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            pass
+    else:
+        latencies, elapsed = asyncio.run(load(args.host, args.port, args.clients, args.games, args.difficulty,
+                                              args.size, args.seed, args.local))
+        print(f"{args.clients * args.games} games, {len(latencies)} moves in {elapsed:.2f} s, "
+              f"{len(latencies) / max(elapsed, 1e-9):.0f} moves/s, "
+              f"p50 {percentile(latencies, 0.5) * 1000:.2f} ms, p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
@@ -0,0 +1,104 @@
+import argparse
+import gc
+import importlib.util
+import os
+import random
+import resource
+import sys
+
+# Долгая сессия в одном окне: много партий подряд через меню и экран
+# выбора уровня. Проверяет, что доска и экраны переиспользуются, а
+# резидентная память после разогрева не растёт.
+
+GAME_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main 2.py')
+
+
+def resident_kb():
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except OSError:
+        # Без /proc доступен только пик использования памяти
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def load_game_module():
+    spec = importlib.util.spec_from_file_location('ugolki_main', GAME_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def close_dialogs():
+    from PyQt6.QtWidgets import QApplication, QMessageBox
+
+    dialog = QApplication.activeModalWidget()
+    if isinstance(dialog, QMessageBox):
+        (dialog.defaultButton() or dialog.buttons()[0]).click()
+
+
+def difficulty_for(index):
+    return ('classic', 'medium', 'hard')[index % 3]
+
+
+def play_session(module, app, games, plies, rng):
+    from PyQt6.QtCore import Qt
+
+    window = module.Game()
+    window.show()
+    colors = [(Qt.GlobalColor.black, Qt.GlobalColor.white), (Qt.GlobalColor.red, Qt.GlobalColor.yellow)]
+    samples = []
+    for index in range(games):
+        window.openColorSelection()
+        window.openPositionChoice(*colors[index % 2])
+        window.startGame(*window.selected_colors, difficulty_for(index))
+        board = window.board
+        for _ in range(plies):
+            movable = [piece for piece in board.pieces if piece.side == board.position.side
+                       and board.getValidMoves(piece)]
+            if not movable:
+                board.changePlayer()
+                continue
+            piece = rng.choice(movable)
+            board.showMoves(piece)
+            board.movePiece(piece, rng.choice(board.getValidMoves(piece)))
+            app.processEvents()
+        board.leaveGame()
+        app.processEvents()
+        if index % 50 == 49:
+            gc.collect()
+            samples.append((index + 1, resident_kb(), window.central_widget.count()))
+    window.close()
+    return samples
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Проверка памяти на длинной сессии")
+    parser.add_argument('-n', '--games', type=int, default=1000)
+    parser.add_argument('--plies', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=100, help="партий до замера базовой памяти")
+    parser.add_argument('--tolerance-mb', type=float, default=16.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(GAME_FILE))
+    module = load_game_module()
+    from PyQt6.QtCore import QTimer
+    from PyQt6.QtWidgets import QApplication
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    # Окна победы и ничьей модальные: закрываем их кнопкой по умолчанию
+    closer = QTimer()
+    closer.timeout.connect(close_dialogs)
+    closer.start(20)
+
+    samples = play_session(module, app, args.games, args.plies, random.Random(args.seed))
+    for games, kb, screens in samples:
+        print(f"{games:6d} games  {kb / 1024:8.1f} MB  {screens} screens")
+    baseline = next((kb for games, kb, _ in samples if games >= args.warmup), samples[0][1])
+    growth = (samples[-1][1] - baseline) / 1024
+    screens = {count for _, _, count in samples}
+    print(f"growth after warmup: {growth:.1f} MB, stacked screens: {sorted(screens)}")
+    if growth > args.tolerance_mb or len(screens) > 1:
+        sys.exit(1)
@@ -0,0 +1,106 @@
+import os
+
+from PyQt6.QtCore import QObject, QTimer, QUrl
+
+# Общие для всего приложения звуки. Файл загружается один раз при первом
+# воспроизведении; QSoundEffect декодирует его асинхронно, а запросы на
+# воспроизведение до готовности откладываются. Отсутствующие и пустые
+# файлы просто пропускаются. QtMultimedia импортируется только при первом
+# настоящем звуке, чтобы не замедлять запуск.
+
+SOUND_DIR = os.path.dirname(os.path.abspath(__file__))
+SOUND_FILES = {
+    'click': 'click.wav',
+    'move': '20.wav',
+    'win': '52.wav',
+    'music': '522.wav',
+}
+# QSoundEffect.Loop.Infinite
+INFINITE = -2
+EXIT_DELAY_MS = 300
+
+_manager = None
+
+
+class SoundManager(QObject):
+    def __init__(self, directory=SOUND_DIR, files=SOUND_FILES):
+        super().__init__()
+        self.directory = directory
+        self.files = files
+        self.effects = {}
+        self.pending = {}
+        self.volume = 0.5
+
+    def effect(self, name):
+        if name in self.effects:
+            return self.effects[name]
+        path = os.path.join(self.directory, self.files[name])
+        if not os.path.isfile(path) or os.path.getsize(path) == 0:
+            self.effects[name] = None
+            return None
+        from PyQt6.QtMultimedia import QSoundEffect
+
+        effect = QSoundEffect(self)
+        effect.setVolume(self.volume)
+        effect.statusChanged.connect(lambda: self.onStatusChanged(name))
+        effect.setSource(QUrl.fromLocalFile(path))
+        self.effects[name] = effect
+        return effect
+
+    def onStatusChanged(self, name):
+        effect = self.effects.get(name)
+        if effect is None:
+            return
+        status = effect.status()
+        if status == effect.Status.Error:
+            self.effects[name] = None
+            self.pending.pop(name, None)
+        elif status == effect.Status.Ready and name in self.pending:
+            effect.setLoopCount(self.pending.pop(name))
+            effect.play()
+
+    def play(self, name, loops=1):
+        effect = self.effect(name)
+        if effect is None:
+            return False
+        if effect.status() == effect.Status.Ready:
+            effect.setLoopCount(loops)
+            effect.play()
+        else:
+            self.pending[name] = loops
+        return True
+
+    def stop(self, name):
+        self.pending.pop(name, None)
+        effect = self.effects.get(name)
+        if effect is not None:
+            effect.stop()
+
+    def setVolume(self, volume):
+        self.volume = volume
+        for effect in self.effects.values():
+            if effect is not None:
+                effect.setVolume(volume)
+
+    def playThen(self, name, callback, limit_ms=EXIT_DELAY_MS):
+        # Вызвать callback, когда звук доиграет (но не позже limit_ms), без sleep
+        if not self.play(name):
+            QTimer.singleShot(0, callback)
+            return
+        effect = self.effects[name]
+        done = []
+
+        def finish():
+            if not done:
+                done.append(True)
+                callback()
+
+        effect.playingChanged.connect(lambda: None if effect.isPlaying() else finish())
+        QTimer.singleShot(limit_ms, finish)
+
+
+def manager():
+    global _manager
+    if _manager is None:
+        _manager = SoundManager()
+    return _manager
@@ -0,0 +1,310 @@
+import argparse
+import math
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+import time
+
+import engine
+
+# Таблицы окончаний: для каждой расстановки фишек одного игрока, у которой
+# вне целевой зоны осталось не больше K фишек, - сколько ходов нужно,
+# чтобы завести в зону все фишки. Таблица строится ретроградным анализом:
+# поиском в ширину от выигранной расстановки (ходы обратимы, поэтому
+# предшественники совпадают с преемниками).
+#
+# Приближение: фишки соперника не учитываются (ни как препятствия, ни как
+# опоры для прыжков), а ходы, выводящие из зоны больше K фишек, запрещены.
+# Поэтому расстояние в таблице - лишь верхняя оценка: путь через
+# расстановку с K + 1 фишками вне зоны бывает короче. Но ход меняет число
+# фишек вне зоны не больше чем на одну, и каждой фишке вне зоны нужен хотя
+# бы один ход, так что из расстановки с k фишками вне зоны такой путь не
+# короче (K + 1 - k) + (K + 1) ходов; расстояние d не больше этого -
+# точное (proven).
+# Точный результат гонки (probe, best_move) отдаётся, только если оба
+# расстояния доказаны и стороны разошлись: прямоугольники, охватывающие
+# фишки и целевую зону каждой стороны, разделены хотя бы одной свободной
+# линией (что кратчайшие пути гонки не выходят за свой прямоугольник,
+# проверено на выборке расстановок, а не доказано). Тогда ходящий игрок
+# побеждает, если ему нужно не больше ходов, чем сопернику. Иначе
+# расстояния гонки (race) годятся только для оценки.
+#
+# Таблица хранится для игрока 0; позиции игрока 1 поворачиваются на 180°.
+# Номер расстановки: слой k (фишек вне зоны), затем номер сочетания
+# пустых клеток зоны и номер сочетания фишек вне зоны.
+
+MAGIC = b'UGTB\x01'
+HEADER = struct.Struct('<5sBBBBB')
+UNKNOWN = 255
+DEFAULT_K = 3
+TABLE_DIR = os.path.dirname(os.path.abspath(__file__))
+CHUNK = 2048
+
+_indexers = {}
+_loaded = {}
+
+
+def table_path(difficulty, size=engine.BOARD_SIZE, directory=TABLE_DIR):
+    return os.path.join(directory, f'tb_{difficulty}_{size}.utb')
+
+
+def rotate(mask, size):
+    # Поворот доски на 180°: клетка sq переходит в size*size - 1 - sq
+    cells = size * size
+    return int(format(mask, f'0{cells}b')[::-1], 2)
+
+
+class Indexer:
+    def __init__(self, difficulty, size, k_max):
+        self.variant = engine.variant(difficulty, size)
+        target = self.variant.target[0]
+        if self.variant.win_count != target.bit_count() or self.variant.start[0].bit_count() != target.bit_count():
+            raise ValueError(f"{difficulty}: победа не требует заполнить всю зону, таблицы не нужны")
+        self.size = size
+        self.k_max = k_max
+        self.target = target
+        cells = size * size
+        self.zone = [sq for sq in range(cells) if target >> sq & 1]
+        self.field = [sq for sq in range(cells) if not target >> sq & 1]
+        # Номер клетки внутри зоны или вне её
+        self.rank = [0] * cells
+        for squares in (self.zone, self.field):
+            for rank, sq in enumerate(squares):
+                self.rank[sq] = rank
+        top = max(len(self.zone), len(self.field)) + 1
+        self.comb = [[math.comb(n, k) for k in range(k_max + 2)] for n in range(top)]
+        self.base = [0]
+        for k in range(k_max + 1):
+            self.base.append(self.base[-1] + self.comb[len(self.zone)][k] * self.comb[len(self.field)][k])
+        self.total = self.base[-1]
+
+    def outside(self, mask):
+        return (mask & ~self.target).bit_count()
+
+    def index(self, mask):
+        target = self.target
+        rank = self.rank
+        comb = self.comb
+        holes = target & ~mask
+        k = holes.bit_count()
+        empty = 0
+        for i, sq in enumerate(engine.squares(holes)):
+            empty += comb[rank[sq]][i + 1]
+        placed = 0
+        for i, sq in enumerate(engine.squares(mask & ~target)):
+            placed += comb[rank[sq]][i + 1]
+        return self.base[k] + empty * comb[len(self.field)][k] + placed
+
+    def unrank(self, number, k, squares):
+        # Сочетание из k клеток squares с номером number
+        chosen = 0
+        for i in range(k, 0, -1):
+            n = i - 1
+            while n + 1 < len(squares) and self.comb[n + 1][i] <= number:
+                n += 1
+            number -= self.comb[n][i]
+            chosen |= 1 << squares[n]
+        return chosen
+
+    def mask(self, index):
+        k = 0
+        while self.base[k + 1] <= index:
+            k += 1
+        empty, placed = divmod(index - self.base[k], self.comb[len(self.field)][k])
+        return (self.target & ~self.unrank(empty, k, self.zone)) | self.unrank(placed, k, self.field)
+
+
+def indexer(difficulty, size, k_max):
+    key = (difficulty, size, k_max)
+    if key not in _indexers:
+        _indexers[key] = Indexer(difficulty, size, k_max)
+    return _indexers[key]
+
+
+def successors(geo, mask):
+    for frm in engine.squares(mask):
+        for to in engine.jump_targets(geo, frm, mask) + engine.step_targets(geo, frm, mask):
+            yield mask ^ (1 << frm) ^ (1 << to)
+
+
+def _expand(job):
+    # Соседи отрезка фронта; выполняется в процессе пула
+    difficulty, size, k_max, indices = job
+    table = indexer(difficulty, size, k_max)
+    geo = table.variant.geometry
+    found = set()
+    for index in indices:
+        for mask in successors(geo, table.mask(index)):
+            if table.outside(mask) <= k_max:
+                found.add(table.index(mask))
+    return found
+
+
+def generate(difficulty, size=engine.BOARD_SIZE, k_max=DEFAULT_K, path=None, workers=None, log=sys.stderr):
+    # Поиск в ширину по уровням; после каждого уровня файл сброшен на диск,
+    # и прерванная генерация продолжается с последнего записанного уровня
+    path = path or table_path(difficulty, size)
+    table = indexer(difficulty, size, k_max)
+    layout = engine.DIFFICULTIES.index(difficulty)
+    if os.path.exists(path):
+        with open(path, 'rb') as file:
+            magic, *header = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC or header[:3] != [layout, size, k_max]:
+            raise ValueError(f"{path}: таблица с другими параметрами")
+    else:
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, layout, size, k_max, 0, 0))
+            remaining = table.total
+            while remaining:
+                block = min(remaining, 1 << 20)
+                file.write(bytes([UNKNOWN]) * block)
+                remaining -= block
+
+    with open(path, 'r+b') as file:
+        data = mmap.mmap(file.fileno(), 0)
+        values = memoryview(data)[HEADER.size:]
+        *_, level, complete = HEADER.unpack_from(data, 0)
+        if level == 0:
+            values[table.index(table.target)] = 0
+        frontier = [index for index in range(table.total) if values[index] == level]
+        started = time.perf_counter()
+        with multiprocessing.Pool(workers) as pool:
+            while frontier and not complete:
+                jobs = [(difficulty, size, k_max, frontier[i:i + CHUNK]) for i in range(0, len(frontier), CHUNK)]
+                reached = set()
+                for found in pool.imap_unordered(_expand, jobs):
+                    reached |= found
+                # Повтор прерванного уровня: его клетки могли уже попасть в файл
+                frontier = sorted(index for index in reached if values[index] in (UNKNOWN, level + 1))
+                for index in frontier:
+                    values[index] = level + 1
+                if frontier:
+                    level += 1
+                    if level >= UNKNOWN:
+                        raise ValueError("Расстояния не помещаются в байт")
+                HEADER.pack_into(data, 0, MAGIC, layout, size, k_max, level, 0)
+                data.flush()
+                if frontier:
+                    print(f"level {level}: {len(frontier)} positions, {time.perf_counter() - started:.1f} s",
+                          file=log)
+        HEADER.pack_into(data, 0, MAGIC, layout, size, k_max, level, 1)
+        data.flush()
+        values.release()
+        data.close()
+    return path
+
+
+class Tablebase:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, layout, size, k_max, self.levels, complete = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or not complete:
+            self.close()
+            raise ValueError(f"{path}: таблица не готова")
+        self.indexer = indexer(engine.DIFFICULTIES[layout], size, k_max)
+        self.variant = self.indexer.variant
+        self.k_max = k_max
+
+    def distance(self, mask, side):
+        # Ходов до заполнения зоны или None, если расстановки нет в таблице
+        if side == 1:
+            mask = rotate(mask, self.variant.size)
+        if self.indexer.outside(mask) > self.k_max:
+            return None
+        value = self.data[HEADER.size + self.indexer.index(mask)]
+        return None if value == UNKNOWN else value
+
+    def race(self, position):
+        # (ходов ходящему, ходов сопернику) без учёта чужих фишек или None
+        target = self.variant.target
+        masks = position.masks
+        if (position.variant is not self.variant or (masks[0] & ~target[0]).bit_count() > self.k_max
+                or (masks[1] & ~target[1]).bit_count() > self.k_max):
+            return None
+        side = position.side
+        own = self.distance(masks[side], side)
+        other = self.distance(masks[1 - side], 1 - side)
+        if own is None or other is None:
+            return None
+        return own, other
+
+    def proven(self, mask, side, distance):
+        # Расстояние distance до зоны для расстановки mask точное
+        outside = (mask & ~self.variant.target[side]).bit_count()
+        return distance <= 2 * self.k_max + 2 - outside
+
+    def box(self, mask):
+        # (x0, y0, x1, y1) прямоугольника, охватывающего клетки mask
+        size = self.variant.size
+        xs = [sq % size for sq in engine.squares(mask)]
+        ys = [sq // size for sq in engine.squares(mask)]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def separated(self, position):
+        target = self.variant.target
+        a = self.box(position.masks[0] | target[0])
+        b = self.box(position.masks[1] | target[1])
+        return a[2] + 1 < b[0] or b[2] + 1 < a[0] or a[3] + 1 < b[1] or b[3] + 1 < a[1]
+
+    def probe(self, position, race=None):
+        # (победитель, полуходов до победы), если гонка точна, иначе None;
+        # race - уже посчитанный race(position)
+        race = race or self.race(position)
+        if race is None:
+            return None
+        own, other = race
+        side = position.side
+        masks = position.masks
+        if (not self.proven(masks[side], side, own) or not self.proven(masks[1 - side], 1 - side, other)
+                or not self.separated(position)):
+            return None
+        if own <= other:
+            return side, 2 * own - 1
+        return 1 - side, 2 * other
+
+    def best_move(self, position):
+        # Ход, быстрее всего заводящий фишки в зону: (ход, ходов до победы)
+        race = self.race(position) if position.variant is self.variant else None
+        side = position.side
+        mask = position.masks[side]
+        if race is None or not self.proven(mask, side, race[0]) or not self.separated(position):
+            return None
+        best = None
+        for frm, to in position.moves():
+            distance = self.distance(mask ^ (1 << frm) ^ (1 << to), side)
+            if distance is not None and (best is None or distance < best[1] - 1):
+                best = ((frm, to), distance + 1)
+        return best
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def load(difficulty, size=engine.BOARD_SIZE):
+    # Готовая таблица из TABLE_DIR или None; результат запоминается
+    key = (difficulty, size)
+    if key not in _loaded:
+        path = table_path(difficulty, size)
+        try:
+            _loaded[key] = Tablebase(path)
+        except (OSError, ValueError):
+            _loaded[key] = None
+    return _loaded[key]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Построение таблиц окончаний ретроградным анализом")
+    parser.add_argument('-d', '--difficulty', choices=engine.DIFFICULTIES, default=engine.CLASSIC)
+    parser.add_argument('--size', type=int, default=engine.BOARD_SIZE)
+    parser.add_argument('-k', type=int, default=DEFAULT_K, help="фишек вне зоны у каждого игрока")
+    parser.add_argument('-j', '--workers', type=int, default=None)
+    parser.add_argument('-o', '--output', default=None)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    path = generate(args.difficulty, args.size, args.k, args.output, args.workers)
+    print(f"{path}: {os.path.getsize(path)} bytes in {time.perf_counter() - started:.1f} s")